@@ -1,91 +1,334 @@
-from flask import Flask, request, jsonify, send_from_directory, make_response
+from flask import Flask, request, jsonify, make_response, g
 from flask_cors import CORS
+import io
 import os
+import base64
 import json
 import uuid
 import time
+import threading
+import zipfile
+import logging
 from werkzeug.utils import secure_filename
 from pdf_parser import PDFParser
+from extraction_cache import ExtractionCache
+from jobs import JobQueue, extract_pdf_job, extract_pdf_items
+from session_store import create_session_store
+from study_items import make_item, QUICKSTART_ITEMS
+from collections import OrderedDict
+from scoring import score_answer, max_answer_length, IncrementalScorer
+from text_ingest import iter_text_items
+from app_logging import configure_logging, REQUEST_LOGGER
+from static_assets import StaticAssets, IMMUTABLE_PREFIX, INDEX_FILE
+from response_encoding import FastJSONProvider, PayloadCache, compress_response
+import metrics
 
 # Configuration - CONSISTENTLY using port 5002
 UPLOAD_FOLDER = 'uploads'
+KEEP_UPLOADS = os.environ.get('TYPESPARK_KEEP_UPLOADS', '').lower() in ('1', 'true')  # Also write uploads to UPLOAD_FOLDER
+CACHE_FOLDER = 'cache'
+STATIC_FOLDER = os.environ.get('TYPESPARK_STATIC_FOLDER', os.path.join(  # React production build
+    os.path.dirname(os.path.abspath(__file__)), '..', 'frontend', 'build'))
+EXTRACTION_CACHE_MAX_BYTES = 100 * 1024 * 1024  # 100MB budget for cached extractions
+STREAM_WAIT_SECONDS = 10  # How long /next waits for a streaming session to produce its next item
+SESSION_FOLDER = 'sessions'
+SESSION_STORE = os.environ.get('TYPESPARK_SESSION_STORE', 'sqlite')  # 'sqlite', 'mmap' or 'memory'
+SESSION_TTL = int(os.environ.get('TYPESPARK_SESSION_TTL', 6 * 60 * 60))  # Idle seconds before a session expires
+SESSION_MAX_BYTES = int(os.environ.get('TYPESPARK_SESSION_MAX_BYTES', 256 * 1024 * 1024))  # LRU budget for session items
+SESSION_CAPACITY = int(os.environ.get('TYPESPARK_SESSION_CAPACITY', 65536))  # Session table slots (mmap store)
+SESSION_PAYLOAD_CACHE_BYTES = 32 * 1024 * 1024  # Serialized /api/session/<id> responses kept per process
+LIVE_SCORE_LIMIT = 1024  # Items being typed with live keystroke scoring, per process
+LIVE_WPM_MIN_SECONDS = 2  # Typing time before /keystrokes reports a WPM, unless the client sends time_taken
 ALLOWED_EXTENSIONS = {'pdf', 'txt'}
 MAX_CONTENT_SIZE = 10 * 1024 * 1024  # 10MB limit
+MAX_TEXT_SIZE = 100 * 1024 * 1024  # Text files are streamed into the session, so they may be larger
+TEXT_BATCH_SIZE = 256  # Items written to the session store at a time while ingesting text
+CORS_MAX_AGE = 24 * 60 * 60  # Seconds browsers may cache a preflight response
+MAX_NEXT_BATCH = 50  # Items returned by one /next?count=N request
+BATCH_MAX_FILES = 50  # Files per batch upload, counting the contents of zip archives
+BATCH_MAX_SIZE = 100 * 1024 * 1024  # Combined size of the files in a batch upload
+BATCH_PARSE_TIMEOUT = 120  # Seconds to wait for a PDF of a batch upload to be parsed
 PORT = 5002  # Consistent port definition
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
+# Log records are written by a background thread; per-request records are sampled
+configure_logging()
+logger = logging.getLogger(__name__)
+request_log = logging.getLogger(REQUEST_LOGGER)
 
-# Improved CORS setup to handle all requests properly
-CORS(app, 
-     resources={r"/*": {"origins": "*"}},  # Apply to ALL routes 
-     supports_credentials=True,
+# The frontend build is served by the catch-all route below rather than Flask's /static route
+app = Flask(__name__, static_folder=None)
+# orjson when installed; compact output without key sorting either way
+app.json = FastJSONProvider(app)
+# One CORS policy for every route. Browsers may cache a preflight response for
+# CORS_MAX_AGE seconds, so /next and /submit are not each preceded by an OPTIONS
+# round trip; Flask answers OPTIONS for every route itself.
+CORS(app,
+     origins="*",
+     send_wildcard=True,
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-     allow_headers=["Content-Type", "Authorization", "X-Requested-With"])
+     allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
+     max_age=CORS_MAX_AGE)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-# Add a CORS preflight handler for all routes
 @app.after_request
-def after_request(response):
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Requested-With')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+def record_request_metrics(response):
+    """Record request latency by route pattern (not path, which would include session ids)"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe('typespark_http_request_duration_seconds', time.perf_counter() - started,
+                        route=route, method=request.method, status=response.status_code)
     return response
 
-# Pre-flight OPTIONS handler for all routes
-@app.route('/', defaults={'path': ''}, methods=['OPTIONS'])
-@app.route('/<path:path>', methods=['OPTIONS'])
-def options_handler(path):
-    response = app.make_default_options_response()
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Requested-With')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    return response
+@app.after_request
+def compress(response):
+    """gzip/brotli encode large JSON and text responses; runs before the latency is recorded"""
+    return compress_response(response, request)
 
 # Import diagnostic routes and register them
 try:
     from app_diagnostics import register_diagnostic_routes
     register_diagnostic_routes(app, UPLOAD_FOLDER)
 except ImportError:
-    print("Warning: app_diagnostics module not found. Diagnostic routes will not be available.")
+    logger.warning("app_diagnostics module not found. Diagnostic routes will not be available.")
 
 # Ensure upload directory exists and is writable
 try:
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     if not os.access(UPLOAD_FOLDER, os.W_OK):
-        print(f"Warning: Upload folder {UPLOAD_FOLDER} is not writable")
+        logger.warning(f"Upload folder {UPLOAD_FOLDER} is not writable")
 except Exception as e:
-    print(f"Error creating upload folder: {str(e)}")
+    logger.error(f"Error creating upload folder: {str(e)}")
+
+# Session data store, shared between worker processes unless the memory backend is selected
+sessions = create_session_store(SESSION_STORE, SESSION_FOLDER, SESSION_TTL, SESSION_MAX_BYTES, SESSION_CAPACITY)
+
+# Cache of PDF extraction results keyed by file content and parser settings
+extraction_cache = ExtractionCache(CACHE_FOLDER, EXTRACTION_CACHE_MAX_BYTES)
+
+# Process pool for asynchronous PDF ingestion (?async=1 on /api/upload); job status is shared by all workers
+os.makedirs(SESSION_FOLDER, exist_ok=True)
+job_queue = JobQueue(os.path.join(SESSION_FOLDER, 'jobs.db'))
+
+# Frontend build files, loaded (and compressed) once so asset requests never touch the disk
+static_assets = StaticAssets(STATIC_FOLDER)
+
+# Full-session payloads are large and only change when the cursor moves or items
+# are appended, so repeat fetches reuse the encoded body
+session_payloads = PayloadCache(SESSION_PAYLOAD_CACHE_BYTES)
 
-# Session data store (In-memory for demo, would use a database in production)
-sessions = {}
+# Live keystroke scoring state per (session_id, item_id), least recently used first
+live_scores = OrderedDict()
+live_scores_lock = threading.Lock()
+
+# Threads of this process filling streaming sessions
+streaming_producers = set()
 
 def allowed_file(filename):
     """Check if the file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-@app.route('/api/upload', methods=['POST', 'OPTIONS'])
-def upload_file():
-    """Handle file upload and process it for study content with better error handling"""
-    # Handle pre-flight OPTIONS request
-    if request.method == 'OPTIONS':
-        response = make_response('', 200)
-        response.headers.extend({
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'POST, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Requested-With'
-        })
-        return response
+def is_cacheable(raw_text):
+    """Only complete extractions are cached, not errors or timeouts"""
+    return not raw_text.startswith(("ERROR EXTRACTING TEXT", "PDF SUPPORT NOT AVAILABLE")) \
+        and "[Processing timeout" not in raw_text
+
+def sample_item():
+    """Placeholder item for sessions where no content could be extracted"""
+    return make_item(
+        'Type this text:',
+        'No content could be extracted. Here is a sample text.',
+        'text',
+        'Sample'
+    )
+
+def create_session(study_items, filename):
+    """Create a session for the extracted study items and return its id"""
+    # Ensure we have at least one study item
+    if not study_items:
+        study_items = [sample_item()]
+        
+    session_id = str(uuid.uuid4())
+    sessions.create(session_id, study_items, filename)
+    return session_id
+
+def create_streaming_session(parser, filename, cache_key):
+    """Create a session that a background thread fills with items as PDF pages are parsed"""
+    session_id = str(uuid.uuid4())
+    sessions.create(session_id, [], filename, streaming=True)
+    
+    def produce():
+        extracted = []
+        try:
+            for item in parser.iter_items():
+                extracted.append(item)
+                if not sessions.append_items(session_id, [item]):
+                    logger.info(f"Streaming session {session_id} expired, stopping extraction")
+                    return
+            if is_cacheable(parser.raw_text):
+                extraction_cache.put(cache_key, parser.raw_text, extracted)
+            logger.info(f"Streaming session {session_id} finished with {len(extracted)} items")
+        except Exception as e:
+            logger.exception(f"Error streaming items for session {session_id}: {str(e)}")
+        finally:
+            if not extracted:
+                sessions.append_items(session_id, [sample_item()])
+            sessions.finish_streaming(session_id)
+            streaming_producers.discard(threading.current_thread())
+    
+    thread = threading.Thread(target=produce, daemon=True)
+    streaming_producers.add(thread)
+    thread.start()
+    return session_id
+
+def finish_background_work():
+    """Wait for the ingestion jobs and streaming sessions started by this process, e.g. before a worker exits"""
+    job_queue.shutdown()
+    for thread in list(streaming_producers):
+        thread.join()
+
+def record_upload(filename, size):
+    """Count an uploaded file in the upload metrics"""
+    file_type = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if file_type not in ALLOWED_EXTENSIONS:
+        file_type = 'other'
+    metrics.inc('typespark_upload_bytes_total', size, type=file_type)
+    metrics.observe('typespark_upload_size_bytes', size, type=file_type)
+
+def persist_upload(data, filename):
+    """Write an uploaded PDF to the upload folder in a background thread; parsing never waits for it"""
+    def write():
+        try:
+            with open(os.path.join(UPLOAD_FOLDER, filename), 'wb') as f:
+                f.write(data)
+        except Exception as e:
+            logger.error(f"Error saving upload {filename}: {str(e)}")
+    
+    threading.Thread(target=write, daemon=True).start()
+
+def append_text_items(session_id, stream):
+    """Append the items of a binary text stream to a session in batches as they are read; returns the count"""
+    count = 0
+    batch = []
+    for item in iter_text_items(stream):
+        batch.append(item)
+        if len(batch) >= TEXT_BATCH_SIZE:
+            sessions.append_items(session_id, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        sessions.append_items(session_id, batch)
+        count += len(batch)
+    return count
+
+def create_text_session(stream, filename):
+    """Create a session from a binary text stream, writing items to the store in batches as they are read"""
+    session_id = str(uuid.uuid4())
+    sessions.create(session_id, [], filename)
+    
+    try:
+        append_text_items(session_id, stream)
+    except Exception:
+        sessions.delete(session_id)
+        raise
+    return session_id
+
+def collect_batch_files(uploads):
+    """
+    Expand the files of a batch upload into (filename, data) pairs, unpacking zip
+    archives. Returns (files, skipped); raises ValueError if the batch is too large.
+    """
+    files = []
+    skipped = []
+    total_size = 0
     
-    print("=== Upload request received ===")
-    print(f"Content-Type: {request.content_type}")
-    print(f"Has file part: {'file' in request.files}")
+    def add(name, size, read):
+        nonlocal total_size
+        filename = secure_filename(os.path.basename(name))
+        if not filename or not allowed_file(filename):
+            skipped.append({'filename': name, 'error': 'Invalid file type'})
+            return
+        max_size = MAX_TEXT_SIZE if filename.lower().endswith('.txt') else MAX_CONTENT_SIZE
+        if size > max_size:
+            skipped.append({'filename': name, 'error': f'File too large. Maximum size is {max_size/1024/1024}MB'})
+            return
+        if len(files) >= BATCH_MAX_FILES:
+            raise ValueError(f'Too many files. Maximum is {BATCH_MAX_FILES} files per batch')
+        if total_size + size > BATCH_MAX_SIZE:
+            raise ValueError(f'Batch too large. Maximum size is {BATCH_MAX_SIZE/1024/1024}MB')
+        # Never read more than the limit, whatever size an archive claims
+        data = read(max_size + 1)
+        if len(data) > max_size:
+            skipped.append({'filename': name, 'error': f'File too large. Maximum size is {max_size/1024/1024}MB'})
+            return
+        total_size += len(data)
+        record_upload(filename, len(data))
+        files.append((filename, data))
     
+    for upload in uploads:
+        if not upload.filename:
+            continue
+        if upload.filename.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(upload.stream)
+            except zipfile.BadZipFile:
+                skipped.append({'filename': upload.filename, 'error': 'Invalid zip archive'})
+                continue
+            with archive:
+                for info in archive.infolist():
+                    # Skip directories and the resource forks macOS adds to archives
+                    if info.is_dir() or info.filename.startswith('__MACOSX/'):
+                        continue
+                    with archive.open(info) as member:
+                        add(info.filename, info.file_size, member.read)
+        else:
+            upload.seek(0, os.SEEK_END)
+            size = upload.tell()
+            upload.seek(0)
+            add(upload.filename, size, upload.read)
+    return files, skipped
+
+def encode_cursor(session_id, position):
+    """Opaque token for a position in a session, returned to clients and passed back to /next"""
+    token = f"{position}:{session_id[:8]}".encode()
+    return base64.urlsafe_b64encode(token).decode().rstrip('=')
+
+def decode_cursor(session_id, cursor):
+    """Return the position a cursor token points at, or None if it is not a valid token for this session"""
+    try:
+        token = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        position, prefix = token.split(':', 1)
+        position = int(position)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if prefix != session_id[:8] or position < 0:
+        return None
+    return position
+
+def wait_for_item(session_id):
+    """Wait until a streaming session has an item at its cursor or finishes; returns True if one is ready"""
+    deadline = time.time() + STREAM_WAIT_SECONDS
+    while True:
+        state = sessions.peek(session_id)
+        if state is None:
+            return False
+        if state['current_index'] < state['total_items']:
+            return True
+        if not state['streaming'] or time.time() > deadline:
+            return False
+        time.sleep(0.05)
+
+@app.route('/api/upload', methods=['POST'])
+def upload_file():
+    """Handle file upload and process it for study content with better error handling"""
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
         
     file = request.files['file']
-    print(f"Filename: {file.filename}")
     
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
@@ -94,250 +337,324 @@ def upload_file():
     file.seek(0, os.SEEK_END)
     file_size = file.tell()
     file.seek(0)  # Reset file pointer
-    print(f"File size: {file_size} bytes")
+    logger.info("Upload received", extra={'upload': file.filename, 'size_bytes': file_size})
+    record_upload(file.filename, file_size)
     
-    if file_size > MAX_CONTENT_SIZE:
-        return jsonify({'error': f'File too large. Maximum size is {MAX_CONTENT_SIZE/1024/1024}MB'}), 413
+    max_size = MAX_TEXT_SIZE if file.filename.lower().endswith('.txt') else MAX_CONTENT_SIZE
+    if file_size > max_size:
+        return jsonify({'error': f'File too large. Maximum size is {max_size/1024/1024}MB'}), 413
         
     if file and allowed_file(file.filename):
         try:
             filename = secure_filename(file.filename)
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            print(f"Saving to: {file_path}")
-            file.save(file_path)
-            print(f"File saved successfully")
             
-            # Process the file based on type
+            # Uploads are parsed from the request buffer; writing them to disk is optional
             study_items = []
             if filename.lower().endswith('.pdf'):
-                print("Processing PDF file...")
-                parser = PDFParser(file_path)
-                study_items = parser.extract_items()
-                print(f"Extracted {len(study_items)} items from PDF")
-            else:
-                # For text files, use a more robust parser
-                print("Processing text file...")
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        text = f.read()
-                except UnicodeDecodeError:
-                    # Try alternate encoding
-                    with open(file_path, 'r', encoding='latin-1') as f:
-                        text = f.read()
-                
-                # Create multiple study items by splitting text into paragraphs
-                paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-                
-                # If no paragraphs found or text is very short, use the entire text as one item
-                if not paragraphs or len(text) < 100:
-                    study_items = [{
-                        'id': str(uuid.uuid4()),
-                        'prompt': 'Type this text:',
-                        'content': text,
-                        'type': 'text',
-                        'context': 'Custom Text'
-                    }]
+                pdf_data = file.read()
+                if KEEP_UPLOADS:
+                    persist_upload(pdf_data, filename)
+                parser = PDFParser(pdf_data)
+                streaming = request.args.get('stream', '').lower() in ('1', 'true')
+                cache_key = ExtractionCache.make_key(pdf_data, parser.cache_settings(streaming=streaming))
+                cached = extraction_cache.get(cache_key)
+                if cached is not None:
+                    study_items = cached['items']
+                    logger.info(f"Extraction cache hit: {len(study_items)} items")
+                elif streaming:
+                    # Serve items while later pages are still being parsed
+                    session_id = create_streaming_session(parser, filename, cache_key)
+                    logger.info(f"Streaming session {session_id} started for {filename}")
+                    
+                    response = jsonify({
+                        'session_id': session_id,
+                        'cursor': encode_cursor(session_id, 0),
+                        'filename': filename,
+                        'items_count': 0,
+                        'streaming': True
+                    })
+                    return response
+                elif request.args.get('async', '').lower() in ('1', 'true'):
+                    # Hand the extraction to the ingestion pool and return immediately
+                    def on_complete(result):
+                        if is_cacheable(result['raw_text']):
+                            extraction_cache.put(cache_key, result['raw_text'], result['items'])
+                        session_id = create_session(result['items'], filename)
+                        return {
+                            'session_id': session_id,
+                            'cursor': encode_cursor(session_id, 0),
+                            'items_count': len(result['items'])
+                        }
+                    
+                    job_id = job_queue.submit(extract_pdf_job, pdf_data,
+                                              on_complete=on_complete, filename=filename)
+                    logger.info(f"Queued ingestion job {job_id} for {filename}")
+                    
+                    response = jsonify({
+                        'job_id': job_id,
+                        'status': 'queued',
+                        'filename': filename
+                    })
+                    return response, 202
                 else:
-                    # Limit to 20 paragraphs for performance
-                    for i, paragraph in enumerate(paragraphs[:20]):
-                        # Only use paragraphs with meaningful content
-                        if len(paragraph) > 10:
-                            study_items.append({
-                                'id': str(uuid.uuid4()),
-                                'prompt': f"Type this paragraph ({i+1}/{min(len(paragraphs), 20)}):",
-                                'content': paragraph,
-                                'type': 'text',
-                                'context': 'Custom Text'
-                            })
-                
-                # If still no items after filtering, create one with the entire text
-                if not study_items:
-                    study_items = [{
-                        'id': str(uuid.uuid4()),
-                        'prompt': 'Type this text:',
-                        'content': text[:2000],  # Limit length for performance
-                        'type': 'text',
-                        'context': 'Custom Text'
-                    }]
-                
-                print(f"Extracted {len(study_items)} items from text file")
-            
-            # Ensure we have at least one study item
-            if not study_items:
-                study_items = [{
-                    'id': str(uuid.uuid4()),
-                    'prompt': 'Type this text:',
-                    'content': 'No content could be extracted. Here is a sample text.',
-                    'type': 'text',
-                    'context': 'Sample'
-                }]
-            
-            # Ensure item content isn't too long (for performance)
-            for item in study_items:
-                if len(item['content']) > 1000:
-                    item['content'] = item['content'][:1000] + '... (content truncated for performance)'
+                    study_items = parser.extract_items()
+                    if is_cacheable(parser.raw_text):
+                        extraction_cache.put(cache_key, parser.raw_text, study_items)
+                    logger.info(f"Extracted {len(study_items)} items from PDF")
                 
-            # Create a session for this content
-            session_id = str(uuid.uuid4())
-            sessions[session_id] = {
-                'items': study_items,
-                'current_index': 0,
-                'total_items': len(study_items),
-                'filename': filename
-            }
+                # Create a session for this content
+                session_id = create_session(study_items, filename)
+            else:
+                # Text files are streamed from the upload straight into the session store
+                session_id = create_text_session(file.stream, filename)
+                if KEEP_UPLOADS:
+                    # The upload stream is released with the request, so copy it now
+                    file.stream.seek(0)
+                    file.save(os.path.join(UPLOAD_FOLDER, filename))
             
             result = {
                 'session_id': session_id,
+                'cursor': encode_cursor(session_id, 0),
                 'filename': filename,
-                'items_count': len(study_items)
+                'items_count': sessions.peek(session_id)['total_items']
             }
-            print(f"Session created successfully: {result}")
+            logger.info("Session created", extra={'session_id': session_id, 'upload': filename,
+                                                  'items_count': result['items_count']})
             
             response = jsonify(result)
-            # Add explicit CORS header
-            response.headers.add('Access-Control-Allow-Origin', '*')
             return response
         except Exception as e:
-            print(f"Error during upload process: {str(e)}")
+            logger.exception(f"Error during upload process: {str(e)}")
             return jsonify({'error': f'Server error during upload: {str(e)}'}), 500
     
-    print(f"Invalid file type: {file.filename}")
+    logger.info(f"Invalid file type: {file.filename}")
     return jsonify({'error': 'Invalid file type'}), 400
 
+@app.route('/api/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Handle an upload of many PDF/text files (or zip archives of them) in one request.
+    PDFs are parsed concurrently in the ingestion pool; the items of all files go
+    into one session in upload order, or into one session per file with ?merge=0.
+    """
+    uploads = request.files.getlist('files') + request.files.getlist('file')
+    if not uploads:
+        return jsonify({'error': 'No file part'}), 400
+    
+    try:
+        files, skipped = collect_batch_files(uploads)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        logger.exception(f"Error reading batch upload: {str(e)}")
+        return jsonify({'error': f'Server error during upload: {str(e)}'}), 500
+    if not files:
+        return jsonify({'error': 'No valid files in batch', 'skipped': skipped}), 400
+    logger.info(f"Batch upload of {len(files)} files ({len(skipped)} skipped)")
+    
+    # Start parsing every PDF that is not cached before ingesting anything
+    pending = {}
+    for index, (filename, data) in enumerate(files):
+        if filename.lower().endswith('.pdf'):
+            cache_key = ExtractionCache.make_key(data, PDFParser(data).cache_settings())
+            cached = extraction_cache.get(cache_key)
+            if cached is not None:
+                pending[index] = (cache_key, cached['items'])
+            else:
+                pending[index] = (cache_key, job_queue.run(extract_pdf_items, data))
+    
+    merge = request.args.get('merge', '1').lower() not in ('0', 'false')
+    if merge:
+        session_id = str(uuid.uuid4())
+        sessions.create(session_id, [], files[0][0] if len(files) == 1 else f"{files[0][0]} and {len(files) - 1} more")
+    
+    results = []
+    for index, (filename, data) in enumerate(files):
+        result = {'filename': filename}
+        if not merge:
+            session_id = str(uuid.uuid4())
+            sessions.create(session_id, [], filename)
+            result['session_id'] = session_id
+            result['cursor'] = encode_cursor(session_id, 0)
+        try:
+            if index in pending:
+                cache_key, extracted = pending[index]
+                if not isinstance(extracted, list):
+                    extracted = extracted.result(timeout=BATCH_PARSE_TIMEOUT)
+                    if is_cacheable(extracted['raw_text']):
+                        extraction_cache.put(cache_key, extracted['raw_text'], extracted['items'])
+                    extracted = extracted['items']
+                sessions.append_items(session_id, extracted)
+                result['items_count'] = len(extracted)
+            else:
+                result['items_count'] = append_text_items(session_id, io.BytesIO(data))
+        except Exception as e:
+            logger.error(f"Error processing {filename} in batch: {str(e)}")
+            result['items_count'] = 0
+            result['error'] = str(e)
+        if not merge and not result['items_count']:
+            sessions.append_items(session_id, [sample_item()])
+        results.append(result)
+    
+    items_count = sum(result['items_count'] for result in results)
+    if merge and not items_count:
+        sessions.append_items(session_id, [sample_item()])
+    
+    response = jsonify({
+        # With ?merge=0 this is the first file's session; the others are listed per file
+        'session_id': session_id if merge else results[0]['session_id'],
+        'cursor': encode_cursor(session_id if merge else results[0]['session_id'], 0),
+        'items_count': items_count,
+        'files': results,
+        'skipped': skipped
+    })
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report the status and page progress of an asynchronous ingestion job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    response = jsonify(job)
+    return response
+
 @app.route('/api/quickstart', methods=['GET'])
 def quickstart():
     """Create a quick start session without file upload"""
     try:
-        # Create sample study items
-        study_items = [
-            {
-                'id': str(uuid.uuid4()),
-                'prompt': 'Type this paragraph:',
-                'content': 'The quick brown fox jumps over the lazy dog. This is a simple sentence for testing typing speed without needing to upload a file.',
-                'type': 'text',
-                'context': 'Quick Start'
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'prompt': 'Type this paragraph:',
-                'content': 'TypeSpark is a typing practice application designed to help you improve your typing skills while studying content from your documents.',
-                'type': 'text',
-                'context': 'Quick Start'
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'prompt': 'Type this paragraph:',
-                'content': 'Practice makes perfect. The more you type, the faster and more accurate you will become. Try to focus on accuracy first, then speed.',
-                'type': 'text',
-                'context': 'Quick Start'
-            }
-        ]
+        # Quick start items are shared records, sessions only reference them
+        study_items = QUICKSTART_ITEMS
         
         # Create a session
         session_id = str(uuid.uuid4())
-        sessions[session_id] = {
-            'items': study_items,
-            'current_index': 0,
-            'total_items': len(study_items),
-            'filename': 'quickstart.txt'
-        }
+        sessions.create(session_id, study_items, 'quickstart.txt')
         
         response = jsonify({
             'session_id': session_id,
+            'cursor': encode_cursor(session_id, 0),
             'filename': 'quickstart.txt',
             'items_count': len(study_items)
         })
-        # Add explicit CORS header
-        response.headers.add('Access-Control-Allow-Origin', '*')
         return response
     except Exception as e:
-        print(f"Error creating quick start session: {str(e)}")
+        logger.exception(f"Error creating quick start session: {str(e)}")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
 @app.route('/api/session/<session_id>', methods=['GET'])
 def get_session(session_id):
-    """Get session information"""
-    if session_id not in sessions:
+    """Get session information, including every item"""
+    state = sessions.peek(session_id)
+    if state is None:
         return jsonify({'error': 'Session not found'}), 404
-        
-    response = jsonify(sessions[session_id])
-    # Add explicit CORS header
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    return response
+    
+    body = session_payloads.get(session_id, (state['current_index'], state['total_items'], state['streaming']))
+    if body is None:
+        session = sessions.get(session_id)
+        if session is None:
+            return jsonify({'error': 'Session not found'}), 404
+        body = app.json.dumps_bytes(dict(session, cursor=encode_cursor(session_id, session['current_index'])))
+        session_payloads.put(session_id, (session['current_index'], session['total_items'], session['streaming']), body)
+    
+    return app.response_class(body, mimetype='application/json')
 
-@app.route('/api/session/<session_id>/next', methods=['GET', 'OPTIONS'])
+@app.route('/api/session/<session_id>/next', methods=['GET'])
 def get_next_item(session_id):
-    """Get the next study item from the session with improved error handling and CORS support"""
-    # Handle pre-flight OPTIONS request
-    if request.method == 'OPTIONS':
-        response = make_response('', 200)
-        response.headers.extend({
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'GET, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Requested-With'
-        })
-        return response
-        
+    """
+    Get the next study item from the session with improved error handling.
+    Pass the 'cursor' of the previous response as ?cursor= to make retries safe: the cursor
+    only advances if it is still at that position, otherwise the same items are returned again.
+    With ?count=N up to N items are returned at once as 'items';
+    with ?prefetch=1 the item that follows is included as 'next_item' without advancing to it.
+    """
     try:
-        # Log the request for debugging
-        print(f"Next item request for session: {session_id}")
+        count = request.args.get('count', type=int)
+        batched = count is not None
+        count = min(max(count or 1, 1), MAX_NEXT_BATCH)
+        prefetch = request.args.get('prefetch', '').lower() in ('1', 'true')
         
-        if session_id not in sessions:
-            print(f"Session not found: {session_id}")
-            print(f"Available sessions: {list(sessions.keys())}")
+        # With a cursor the request is idempotent: a retry gets the same items instead of advancing again
+        cursor = request.args.get('cursor')
+        expected_index = None
+        if cursor is not None:
+            expected_index = decode_cursor(session_id, cursor)
+            if expected_index is None:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        
+        # Read the items at the cursor and advance it past them in one atomic step
+        advanced = sessions.advance_many(session_id, count, expected_index)
+        if advanced is None:
+            request_log.info("Session not found", extra={'session_id': session_id})
             return jsonify({'error': 'Session not found'}), 404
             
-        session = sessions[session_id]
-        print(f"Session data: {session['current_index']}/{session['total_items']}")
+        items, state = advanced
+        
+        if expected_index is not None and expected_index > state['current_index']:
+            # The client is ahead of the session, e.g. a cursor from an abandoned request
+            return jsonify({
+                'error': 'Cursor is ahead of the session',
+                'cursor': encode_cursor(session_id, state['current_index'])
+            }), 409
+        
+        if not items and state['streaming'] and wait_for_item(session_id):
+            items, state = sessions.advance_many(session_id, count, expected_index) or ([], state)
         
-        if session['current_index'] >= session['total_items']:
-            print(f"No more items in session {session_id}")
+        start = state['current_index'] - len(items) if expected_index is None else expected_index
+        end = start + len(items)
+        
+        if not items and state['streaming']:
+            # The parser has not produced the next item yet; the client should retry with this cursor
+            return jsonify({
+                'pending': True,
+                'cursor': encode_cursor(session_id, start),
+                'progress': {
+                    'current': start,
+                    'total': state['total_items']
+                }
+            }), 202
+        
+        if not items:
+            request_log.info("Session completed", extra={'session_id': session_id})
             return jsonify({
                 'error': 'No more items in session',
                 'session_completed': True
             }), 400
-            
-        item = session['items'][session['current_index']]
-        session['current_index'] += 1
         
-        print(f"Returning item {session['current_index']}/{session['total_items']} for session {session_id}")
+        request_log.info("Next item", extra={'session_id': session_id, 'current': end,
+                                             'total': state['total_items'], 'count': len(items)})
         
-        response = jsonify({
-            'item': item,
+        result = {
+            # Pass this back as ?cursor= to get the following items
+            'cursor': encode_cursor(session_id, end),
             'progress': {
-                'current': session['current_index'],
-                'total': session['total_items']
+                'current': end,
+                'total': state['total_items']
             }
-        })
+        }
+        if batched:
+            result['items'] = items
+        else:
+            result['item'] = items[0]
+        if prefetch:
+            # Lets the client show the following item as soon as this one is typed
+            following = sessions.items_at(session_id, end, 1)
+            result['next_item'] = following[0] if following else None
+        
+        response = jsonify(result)
         
-        # Explicitly add CORS headers to the response
-        response.headers.add('Access-Control-Allow-Origin', '*')
         return response
         
     except Exception as e:
-        print(f"Error getting next item: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception(f"Error getting next item: {str(e)}")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
-@app.route('/api/session/<session_id>/submit', methods=['POST', 'OPTIONS'])
+@app.route('/api/session/<session_id>/submit', methods=['POST'])
 def submit_answer(session_id):
-    """Submit an answer for the current item with improved CORS support"""
-    # Handle pre-flight OPTIONS request
-    if request.method == 'OPTIONS':
-        response = make_response('', 200)
-        response.headers.extend({
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'POST, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type, Authorization, X-Requested-With'
-        })
-        return response
-        
+    """Submit an answer for the current item"""
     try:
-        print(f"Submit answer request for session: {session_id}")
-        print(f"Request data: {request.json}")
-        
-        if session_id not in sessions:
+        state = sessions.peek(session_id)
+        if state is None:
             return jsonify({'error': 'Session not found'}), 404
         
         data = request.json
@@ -345,25 +662,23 @@ def submit_answer(session_id):
             return jsonify({'error': 'Missing answer or item_id'}), 400
         
         # Find the item by ID
-        session = sessions[session_id]
         item_id = data['item_id']
         user_answer = data['answer']
+        if not isinstance(user_answer, str):
+            return jsonify({'error': 'Answer must be a string'}), 400
         
-        item = None
-        for i in session['items']:
-            if i['id'] == item_id:
-                item = i
-                break
+        item = sessions.find_item(session_id, item_id)
         
         if not item:
             return jsonify({'error': 'Item not found'}), 404
         
-        # Calculate accuracy
+        # Scoring time grows with the answer, so far longer answers than the text are not scored
         expected = item['content']
-        # Limit comparison length for performance
-        max_compare_length = min(len(expected), len(user_answer), 1000)
-        matches = sum(1 for a, b in zip(user_answer[:max_compare_length], expected[:max_compare_length]) if a == b)
-        accuracy = matches / max(len(expected[:max_compare_length]), 1) if expected else 0
+        if len(user_answer) > max_answer_length(expected):
+            return jsonify({'error': 'Answer too long', 'max_length': max_answer_length(expected)}), 413
+        
+        # Calculate accuracy from the edit-distance alignment of the answer
+        score = score_answer(expected, user_answer)
         
         # Calculate WPM (words per minute)
         time_taken = data.get('time_taken', 60)  # Default to 60 seconds if not provided
@@ -373,32 +688,131 @@ def submit_answer(session_id):
         # Store results
         result = {
             'item_id': item_id,
-            'accuracy': accuracy,
+            'accuracy': score['accuracy'],
             'wpm': wpm,
-            'time_taken': time_taken
+            'time_taken': time_taken,
+            'errors': {
+                'insertions': score['insertions'],
+                'deletions': score['deletions'],
+                'substitutions': score['substitutions']
+            }
         }
         
         # In a real app, we'd store this result in a database
-        print(f"Calculated result: {result}")
+        request_log.info("Answer scored", extra={'session_id': session_id, 'item_id': item_id,
+                                                 'accuracy': result['accuracy'], 'wpm': wpm})
+        
+        with live_scores_lock:
+            live_scores.pop((session_id, item_id), None)
+        sessions.clear_answer(session_id, item_id)
         
         response = jsonify({
             'result': result,
             'progress': {
-                'current': session['current_index'],
-                'total': session['total_items']
+                'current': state['current_index'],
+                'total': state['total_items']
             }
         })
         
-        # Explicitly add CORS headers to the response
-        response.headers.add('Access-Control-Allow-Origin', '*')
         return response
         
     except Exception as e:
-        print(f"Error submitting answer: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception(f"Error submitting answer: {str(e)}")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+@app.route('/api/session/<session_id>/keystrokes', methods=['POST'])
+def submit_keystrokes(session_id):
+    """
+    Score an answer while it is typed. The client posts keystroke deltas
+    ({'item_id', 'keys', 'position'}; '\\b' in keys is a backspace) and gets live
+    accuracy and WPM back; WPM is null for the first LIVE_WPM_MIN_SECONDS unless
+    the client sends its own time_taken. position is the answer length the delta
+    applies to; if the stored answer disagrees it answers 409 with its own
+    position, and the client resends the answer from there. The answer so far is kept in the
+    session store, so deltas may reach any worker; each worker keeps the scoring
+    state of recent answers and replays the stored text when it is out of date.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not data or 'item_id' not in data or not isinstance(data.get('keys', ''), str):
+            return jsonify({'error': 'Missing item_id or keys'}), 400
+        
+        item_id = data['item_id']
+        key = (session_id, item_id)
+        with live_scores_lock:
+            live = live_scores.get(key)
+            if live is not None:
+                live_scores.move_to_end(key)
+        
+        if live is None:
+            if sessions.peek(session_id) is None:
+                return jsonify({'error': 'Session not found'}), 404
+            item = sessions.find_item(session_id, item_id)
+            if not item:
+                return jsonify({'error': 'Item not found'}), 404
+            live = {'scorer': IncrementalScorer(item['content']), 'started': time.time(), 'lock': threading.Lock()}
+            with live_scores_lock:
+                live = live_scores.setdefault(key, live)
+                while len(live_scores) > LIVE_SCORE_LIMIT:
+                    live_scores.popitem(last=False)
+        
+        with live['lock']:
+            scorer = live['scorer']
+            stored = sessions.load_answer(session_id, item_id)
+            if (stored[0] if stored is not None else '') != scorer.typed:
+                # Another worker scored (or submitted) the answer since this one last saw it
+                scorer = live['scorer'] = IncrementalScorer(scorer.expected)
+                if stored is not None:
+                    scorer.feed(stored[0])
+                live['started'] = stored[1] if stored is not None else time.time()
+            
+            position = data.get('position', len(scorer))
+            if position != len(scorer):
+                return jsonify({'error': 'Keystroke position mismatch', 'position': len(scorer)}), 409
+            
+            keys = data.get('keys', '')
+            if len(scorer) + len(keys) > max_answer_length(scorer.expected):
+                return jsonify({'error': 'Answer too long', 'max_length': max_answer_length(scorer.expected)}), 413
+            
+            scorer.feed(keys)
+            typed = len(scorer)
+            errors = scorer.errors()
+            sessions.save_answer(session_id, item_id, scorer.typed, live['started'])
+        
+        # The clock starts when the first delta arrives, so over the first moments
+        # the rate is dominated by when that delta was sent; report none until then
+        time_taken = data.get('time_taken') or (time.time() - live['started'])
+        if data.get('time_taken') or time_taken >= LIVE_WPM_MIN_SECONDS:
+            # Standard WPM counts five characters as a word
+            wpm = (typed / 5) / time_taken * 60 if time_taken > 0 else 0
+        else:
+            wpm = None
+        
+        return jsonify({
+            'position': typed,
+            'errors': errors,
+            'accuracy': max(typed - errors, 0) / typed if typed else 1.0,
+            'wpm': wpm,
+            'time_taken': time_taken
+        })
+        
+    except Exception as e:
+        logger.exception(f"Error scoring keystrokes: {str(e)}")
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request, parsing, cache and upload metrics of all server processes in the Prometheus text format"""
+    stats = sessions.stats()
+    cache_stats = extraction_cache.stats()
+    response = make_response(metrics.render({
+        'typespark_sessions': ('Stored sessions', stats['sessions']),
+        'typespark_session_store_bytes': ('Serialized size of stored session items', stats['total_bytes']),
+        'typespark_extraction_cache_bytes': ('Size of the extraction cache on disk', cache_stats['total_bytes'])
+    }))
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint to verify the server is running"""
@@ -407,34 +821,34 @@ def health_check():
         'version': '1.0',
         'upload_folder': UPLOAD_FOLDER,
         'upload_folder_exists': os.path.exists(UPLOAD_FOLDER),
+        'extraction_cache': extraction_cache.stats(),
+        'session_store': sessions.stats(),
         'timestamp': time.time(),
         'port': PORT  # Include port info in health check
     })
-    # Add explicit CORS header
-    response.headers.add('Access-Control-Allow-Origin', '*')
     return response
 
 # Serve React app
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
-    if path != "" and os.path.exists(app.static_folder + '/' + path):
-        return send_from_directory(app.static_folder, path)
-    else:
-        return send_from_directory(app.static_folder, 'index.html')
+    response = static_assets.response(path, request)
+    if response is not None:
+        return response
+    if path.startswith(IMMUTABLE_PREFIX):
+        # A missing script or stylesheet must not be answered with the HTML page
+        return jsonify({'error': 'Not found'}), 404
+    # Client-side routes are handled by the React app
+    response = static_assets.response(INDEX_FILE, request)
+    if response is None:
+        return jsonify({'error': 'Frontend build not found'}), 404
+    return response
 
 @app.errorhandler(Exception)
 def handle_exception(e):
-    """Global error handler with CORS headers"""
-    print(f"Unhandled exception: {str(e)}")
-    response = jsonify({'error': 'An unexpected error occurred'})
-    
-    # Always add CORS headers to error responses
-    response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Requested-With')
-    response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
-    
-    return response, 500
+    """Global error handler; the CORS policy adds its headers to this response like any other"""
+    logger.exception(f"Unhandled exception: {str(e)}")
+    return jsonify({'error': 'An unexpected error occurred'}), 500
 
 if __name__ == '__main__':
     import argparse
@@ -450,5 +864,5 @@ if __name__ == '__main__':
     # Ensure uploads directory exists
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     
-    print(f"Starting TypeSpark backend on port {args.port}")
+    logger.info(f"Starting TypeSpark backend on port {args.port}")
     app.run(debug=args.debug, host=args.host, port=args.port)
\ No newline at end of file
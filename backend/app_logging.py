@@ -0,0 +1,138 @@
+"""
+Structured, non-blocking logging for TypeSpark.
+Request threads only put records on a bounded queue; a listener thread formats
+them (as JSON lines by default) and writes them to stderr, so slow terminal or
+pipe writes never add to request latency. Per-request logs go to the
+'typespark.requests' logger, which passes only a sample of records below WARNING.
+"""
+
+import os
+import sys
+import json
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+
+LOG_LEVEL = os.environ.get('TYPESPARK_LOG_LEVEL', 'info').upper()
+LOG_FORMAT = os.environ.get('TYPESPARK_LOG_FORMAT', 'json')  # 'json' or 'text'
+
+# Fraction of per-request records (below WARNING) that are logged
+REQUEST_SAMPLE_RATE = float(os.environ.get('TYPESPARK_LOG_SAMPLE_RATE', 0.01))
+
+# Records waiting for the listener; when the queue is full new records are dropped
+QUEUE_SIZE = 10000
+
+REQUEST_LOGGER = 'typespark.requests'
+
+# Attributes every LogRecord has; anything else was passed with extra= and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+_queue_handler = None
+
+
+def _fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Format records as one JSON object per line, with extra= fields as keys"""
+
+    def format(self, record):
+        entry = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage()
+        }
+        entry.update(_fields(record))
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Format records as readable lines, with extra= fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Pass a random fraction of records below WARNING; warnings and errors always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking or erroring when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+def _start_listener(handler):
+    global _listener
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, handler)
+    _listener.start()
+
+
+def _after_fork():
+    """
+    A forked worker (gunicorn with a preloaded app) inherits the queue but not the
+    listener thread; give it a fresh queue, since the parent's may have been locked
+    mid-operation, and its own listener.
+    """
+    if _listener is None:
+        return
+    handler = _listener.handlers[0]
+    _queue_handler.queue = queue.Queue(QUEUE_SIZE)
+    _start_listener(handler)
+
+
+def _stop_listener():
+    """Flush queued records on exit"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def configure_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, sample_rate=REQUEST_SAMPLE_RATE):
+    """Route all logging through the queue to a listener thread; safe to call more than once"""
+    global _queue_handler
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(StructuredFormatter() if log_format == 'json' else TextFormatter())
+    _queue_handler = DroppingQueueHandler(queue.Queue(QUEUE_SIZE))
+
+    # Replace the stream handler installed by basicConfig in the other modules
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    logging.getLogger(REQUEST_LOGGER).addFilter(SamplingFilter(sample_rate))
+
+    _start_listener(handler)
+    atexit.register(_stop_listener)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_after_fork)
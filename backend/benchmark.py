@@ -0,0 +1,339 @@
+"""
+Offline benchmark suite for TypeSpark's parser and API hot paths.
+Synthetic PDFs of several sizes and layouts are generated with reportlab, then
+text extraction, item extraction, chunking, answer scoring and the end-to-end
+/upload -> /next -> /submit flow (with concurrent clients) are timed. Results
+are written as JSON; pass --baseline with an earlier result file to report
+benchmarks that got slower.
+
+    python benchmark.py --output bench.json
+    python benchmark.py --quick --baseline bench.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+import pdf_parser
+from pdf_parser import PDFParser, HAS_PYMUPDF, HAS_PYPDF2
+from scoring import score_answer, IncrementalScorer, BACKSPACE
+
+WORDS = (
+    "the study of memory shows that spaced repetition improves recall over time while typing practice "
+    "builds fluency through attention to every character in a passage students remember concepts "
+    "better when they write them out and review them regularly across several sessions"
+).split()
+
+LAYOUTS = ('prose', 'definitions', 'lists', 'dense')
+
+# (pages, repeats) per document size
+SIZES = {'small': (2, 5), 'medium': (10, 3), 'large': (50, 2)}
+QUICK_SIZES = {'small': (2, 3), 'medium': (10, 1)}
+
+# By default a benchmark is a regression when its median is 20% slower than the baseline
+REGRESSION_THRESHOLD = 0.2
+
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _page_lines(rng, layout, page):
+    """Lines of text for one page; an empty string is a paragraph break"""
+    lines = []
+    while len(lines) < 40:
+        if layout == 'prose':
+            lines += [_sentence(rng) for _ in range(rng.randint(2, 5))] + [""]
+        elif layout == 'definitions':
+            term = " ".join(rng.choice(WORDS) for _ in range(2)).title()
+            lines += [f"{term} {page}: {_sentence(rng, 10)}", ""]
+        elif layout == 'lists':
+            lines += [f"{i}. {_sentence(rng, 6)}" for i in range(1, rng.randint(3, 6))] + [""]
+            lines += [f"- {_sentence(rng, 5)}" for _ in range(3)] + [""]
+        else:
+            lines.append(_sentence(rng, 14))
+    return lines[:40]
+
+
+def make_pdf(pages, layout, seed=0):
+    """Return the bytes of a synthetic PDF with the given page count and layout"""
+    rng = random.Random(f"{layout}-{pages}-{seed}")
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    for page in range(pages):
+        y = 750
+        for line in _page_lines(rng, layout, page):
+            if line:
+                pdf.drawString(40, y, line[:110])
+            y -= 18
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def timed(fn, repeat):
+    """Run fn repeat times and return timing statistics in seconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min_s': min(samples),
+        'median_s': statistics.median(samples),
+        'mean_s': statistics.mean(samples)
+    }
+
+
+def bench_parser(sizes):
+    """
+    Time extract_text and extract_items per document size and layout, with the
+    parser's default page workers and page budget as used for uploads
+    """
+    results = {}
+    for size, (pages, repeat) in sizes.items():
+        for layout in LAYOUTS:
+            data = make_pdf(pages, layout)
+            parser = PDFParser(data)
+
+            def extract_text():
+                parser.raw_text = ""
+                parser.extract_text()
+
+            stats = timed(extract_text, repeat)
+            # Pages actually extracted, which the page and content budgets may cap below the document's
+            stats['pages'] = parser.pages_processed
+            stats['document_pages'] = pages
+            stats['workers'] = parser.workers
+            stats['pages_per_second'] = parser.pages_processed / stats['median_s'] if stats['median_s'] else None
+            results[f"extract_text.{size}.{layout}"] = stats
+
+            stats = timed(parser.extract_items, repeat)
+            stats['characters'] = len(parser.raw_text)
+            results[f"extract_items.{size}.{layout}"] = stats
+    return results
+
+
+def bench_chunking(repeat):
+    """Time chunking a large text without item matches, the extract_items fallback path"""
+    rng = random.Random(1)
+    text = "\n".join(_sentence(rng, 14) for _ in range(10000))
+
+    def chunk():
+        for _ in PDFParser._iter_chunk_bounds(text, 500):
+            pass
+
+    stats = timed(chunk, repeat)
+    stats['characters'] = len(text)
+    return {'iter_chunk_bounds.1mb': stats}
+
+
+def _perturb(text, edits, rng):
+    chars = list(text)
+    for _ in range(edits):
+        position = rng.randrange(len(chars))
+        operation = rng.choice(('insert', 'delete', 'substitute'))
+        if operation == 'insert':
+            chars.insert(position, rng.choice('abcdefgh'))
+        elif operation == 'delete' and len(chars) > 1:
+            del chars[position]
+        else:
+            chars[position] = rng.choice('abcdefgh')
+    return "".join(chars)
+
+
+def bench_scoring(repeat):
+    """Time final scoring of close and distant answers and live keystroke scoring"""
+    rng = random.Random(2)
+    expected = " ".join(_sentence(rng, 14) for _ in range(8))
+    results = {}
+    for name, edits in (('exact', 0), ('close', 5), ('distant', 400)):
+        answer = _perturb(expected, edits, rng)
+        results[f"score_answer.{name}"] = timed(lambda: score_answer(expected, answer), repeat * 10)
+        results[f"score_answer.{name}"]['characters'] = len(expected)
+
+    # Type the passage one key at a time with a typo corrected every 40 characters
+    keys = []
+    for i, char in enumerate(expected):
+        if i % 40 == 39:
+            keys += ['x', BACKSPACE]
+        keys.append(char)
+
+    def type_passage():
+        scorer = IncrementalScorer(expected)
+        for key in keys:
+            scorer.feed(key)
+            scorer.errors()
+
+    stats = timed(type_passage, repeat)
+    stats['keystrokes'] = len(keys)
+    stats['keystrokes_per_second'] = len(keys) / stats['median_s'] if stats['median_s'] else None
+    results['incremental_scorer.keystrokes'] = stats
+    return results
+
+
+def bench_api(clients, uploads_per_client, pages):
+    """
+    Run concurrent clients that each upload distinct PDFs and work through every
+    item (/next then /submit). Reports throughput and request latency percentiles.
+    """
+    # The app keeps its uploads, cache and sessions relative to the working directory
+    workdir = tempfile.mkdtemp(prefix='typespark-bench-')
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import app as typespark
+
+        documents = [[make_pdf(pages, LAYOUTS[(client + i) % len(LAYOUTS)], seed=f"api-{client}-{i}")
+                      for i in range(uploads_per_client)] for client in range(clients)]
+        latencies = {'upload': [], 'next': [], 'submit': []}
+
+        def request(kind, call):
+            start = time.perf_counter()
+            response = call()
+            latencies[kind].append(time.perf_counter() - start)
+            return response
+
+        def run_client(client):
+            http = typespark.app.test_client()
+            for i, data in enumerate(documents[client]):
+                response = request('upload', lambda: http.post(
+                    '/api/upload', data={'file': (io.BytesIO(data), f"bench-{client}-{i}.pdf")},
+                    content_type='multipart/form-data'))
+                session_id = response.get_json()['session_id']
+                while True:
+                    response = request('next', lambda: http.get(f"/api/session/{session_id}/next"))
+                    if response.status_code != 200:
+                        break
+                    item = response.get_json()['item']
+                    request('submit', lambda: http.post(
+                        f"/api/session/{session_id}/submit",
+                        json={'item_id': item['id'], 'answer': item['content'][:-2], 'time_taken': 30}))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            list(pool.map(run_client, range(clients)))
+        elapsed = time.perf_counter() - start
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    total = sum(len(samples) for samples in latencies.values())
+    result = {
+        'clients': clients,
+        'uploads': clients * uploads_per_client,
+        'pages_per_upload': pages,
+        'session_store': typespark.SESSION_STORE,
+        'elapsed_s': elapsed,
+        'requests': total,
+        'requests_per_second': total / elapsed
+    }
+    for kind, samples in latencies.items():
+        samples.sort()
+        result[f"{kind}_p50_s"] = samples[len(samples) // 2]
+        result[f"{kind}_p95_s"] = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    # median_s makes the end-to-end run comparable against a baseline like the other benchmarks
+    result['median_s'] = elapsed
+    return {'api.upload_next_submit': result}
+
+
+def environment():
+    """Describe the machine and code the results were measured on"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'page_workers': pdf_parser.PAGE_WORKERS,
+        'pymupdf': HAS_PYMUPDF,
+        'pypdf2': HAS_PYPDF2
+    }
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Return [(name, baseline median, current median)] for benchmarks slower than the threshold"""
+    regressions = []
+    for name, stats in results.items():
+        before = baseline.get('results', {}).get(name, {}).get('median_s')
+        after = stats.get('median_s')
+        if before and after and after > before * (1 + threshold):
+            regressions.append((name, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the TypeSpark parser and API hot paths')
+    parser.add_argument('--output', default='benchmark_results.json', help='File to write the JSON results to')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Slowdown against the baseline reported as a regression (0.2 = 20%%)')
+    parser.add_argument('--quick', action='store_true', help='Smaller documents and fewer repeats')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent clients in the API benchmark')
+    parser.add_argument('--uploads', type=int, default=2, help='Uploads per client in the API benchmark')
+    parser.add_argument('--skip-api', action='store_true', help='Skip the end-to-end API benchmark')
+    parser.add_argument('--page-workers', type=int,
+                        help='Page extraction processes (default: one per core, up to 8)')
+    args = parser.parse_args()
+
+    if args.page_workers:
+        pdf_parser.PAGE_WORKERS = args.page_workers
+
+    # Per-document log lines would dominate the timings
+    logging.disable(logging.INFO)
+    os.environ.setdefault('TYPESPARK_LOG_LEVEL', 'WARNING')
+
+    repeat = 2 if args.quick else 5
+    results = {}
+    print("Benchmarking PDF extraction...")
+    results.update(bench_parser(QUICK_SIZES if args.quick else SIZES))
+    print("Benchmarking chunking and scoring...")
+    results.update(bench_chunking(repeat))
+    results.update(bench_scoring(repeat))
+    if not args.skip_api:
+        print(f"Benchmarking the API with {args.clients} concurrent clients...")
+        results.update(bench_api(args.clients, args.uploads, 3 if args.quick else 10))
+
+    for name, stats in results.items():
+        print(f"  {name:45s} {stats['median_s'] * 1000:10.2f} ms")
+
+    report = {'environment': environment(), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Content-addressed extraction cache for TypeSpark.
+Extraction results are keyed by a hash of the uploaded file bytes and the parser
+settings, so repeat uploads of the same document skip PDF parsing entirely.
+Entries are files on disk shared by every process using the cache directory;
+file modification times record access order, and the least recently used
+entries are evicted to keep the whole directory under a byte budget.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+import metrics
+
+# fcntl is only available on POSIX systems; without it eviction runs without a cross-process lock
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Default byte budget for the on-disk cache (100MB)
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+# Block size used when hashing files
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class ExtractionCache:
+    """LRU cache of extracted raw text and study items, persisted as one JSON file per entry"""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Lookups and evictions made by this process
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entries = self._scan()
+            logger.info(f"Extraction cache has {len(entries)} entries "
+                        f"({sum(size for _, _, size in entries) / 1024:.2f} KB)")
+            self._evict()
+        except Exception as e:
+            logger.error(f"Error initializing extraction cache: {str(e)}")
+
+    @staticmethod
+    def make_key(source, settings):
+        """Build a cache key from file bytes (or a file path) and the parser settings"""
+        digest = hashlib.sha256()
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            digest.update(source)
+        else:
+            with open(source, 'rb') as f:
+                for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                    digest.update(block)
+        digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _scan(self):
+        """Return [(mtime, key, size)] for the entries on disk, least recently used first"""
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, filename))
+            except OSError:
+                # Removed by another process since listdir
+                continue
+            entries.append((stat.st_mtime, filename[:-len('.json')], stat.st_size))
+        return sorted(entries)
+
+    def get(self, key):
+        """Return the cached entry for key ({'raw_text', 'items'}) or None on a miss"""
+        file_path = self._entry_path(key)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # Record the access on disk, where every process sees it, for LRU eviction
+            os.utime(file_path, None)
+        except FileNotFoundError:
+            self._count('misses', 'miss')
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+            self._remove(key)
+            self._count('misses', 'miss')
+            return None
+
+        self._count('hits', 'hit')
+        return entry
+
+    def _count(self, attribute, result):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+        metrics.inc('typespark_extraction_cache_requests_total', result=result)
+
+    def put(self, key, raw_text, items):
+        """Store an extraction result, evicting least-recently-used entries if over budget"""
+        payload = json.dumps({
+            'raw_text': raw_text,
+            'items': items,
+            'created': time.time()
+        }).encode('utf-8')
+
+        if len(payload) > self.max_bytes:
+            logger.info(f"Extraction result too large to cache ({len(payload)} bytes)")
+            return False
+
+        file_path = self._entry_path(key)
+        temp_path = f"{file_path}.{os.getpid()}.tmp"
+        try:
+            # Write to a temporary file first so readers never see a partial entry
+            with open(temp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(temp_path, file_path)
+        except Exception as e:
+            logger.error(f"Error writing cache entry {key}: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+
+        try:
+            self._evict()
+        except Exception as e:
+            logger.error(f"Error evicting cache entries: {str(e)}")
+        return True
+
+    def _remove(self, key):
+        try:
+            os.remove(self._entry_path(key))
+            return True
+        except OSError:
+            return False
+
+    def _evict(self):
+        """
+        Evict least-recently-used entries until the directory fits the byte budget.
+        The budget covers the entries of all processes, so the directory is scanned
+        under an exclusive lock rather than trusting this process's own accounting.
+        """
+        lock_fd = os.open(os.path.join(self.cache_dir, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            entries = self._scan()
+            total_bytes = sum(size for _, _, size in entries)
+            for _, key, size in entries:
+                if total_bytes <= self.max_bytes:
+                    break
+                if self._remove(key):
+                    with self._lock:
+                        self.evictions += 1
+                total_bytes -= size
+        finally:
+            os.close(lock_fd)
+
+    def stats(self):
+        """Return cache statistics for diagnostics; entries and bytes cover all processes"""
+        entries = self._scan()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(entries),
+                'total_bytes': sum(size for _, _, size in entries),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0
+            }
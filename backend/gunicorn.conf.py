@@ -0,0 +1,59 @@
+"""
+Gunicorn configuration for running the TypeSpark backend in production:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Every setting can be overridden with the TYPESPARK_* environment variables below.
+The app is preloaded in the master so PyMuPDF and the parser modules are
+imported once and shared copy-on-write by the workers, and workers are
+recycled after a number of requests to keep PDF library memory growth in check.
+Sessions, job status and the answers being typed are kept in the shared session
+folder, so any worker can serve any request; a worker that is recycled or
+stopped first finishes the uploads it is still ingesting.
+"""
+
+import os
+import logging
+import multiprocessing
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CPU_COUNT = multiprocessing.cpu_count()
+
+bind = os.environ.get('TYPESPARK_BIND', f"0.0.0.0:{os.environ.get('TYPESPARK_PORT', 5002)}")
+
+# PDF extraction runs in process pools, so request handlers mostly wait on I/O
+# (uploads, the session store, /next long-polling); threads absorb that waiting
+worker_class = 'gthread'
+workers = int(os.environ.get('TYPESPARK_WORKERS', CPU_COUNT * 2 + 1))
+threads = int(os.environ.get('TYPESPARK_THREADS', 8))
+
+# The memory session store is private to one process, so it cannot be shared by workers
+if os.environ.get('TYPESPARK_SESSION_STORE', 'sqlite') == 'memory' and workers > 1:
+    logger.warning("The memory session store only supports one worker, starting a single worker")
+    workers = 1
+
+# Import app, pdf_parser and fitz once in the master instead of in every worker
+preload_app = True
+
+# Recycle workers after this many requests (jittered so they do not restart together)
+max_requests = int(os.environ.get('TYPESPARK_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('TYPESPARK_MAX_REQUESTS_JITTER', max_requests // 10))
+
+# A synchronous upload may parse for 30 seconds and a batch upload for longer
+timeout = int(os.environ.get('TYPESPARK_WORKER_TIMEOUT', 180))
+graceful_timeout = 30
+keepalive = 5
+
+# Access logging is off unless a path (or '-' for stdout) is given
+accesslog = os.environ.get('TYPESPARK_ACCESS_LOG')
+errorlog = '-'
+loglevel = os.environ.get('TYPESPARK_LOG_LEVEL', 'info')
+
+
+def worker_exit(server, worker):
+    """Let queued ingestion jobs and streaming sessions finish before the worker process exits"""
+    import app
+    app.finish_background_work()
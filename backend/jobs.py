@@ -0,0 +1,187 @@
+"""
+Background job queue for TypeSpark PDF ingestion.
+Extraction runs in a process pool so slow PDFs never block request threads.
+Job status and per-page progress are rows of a SQLite table shared by every
+server worker, so /api/jobs/<id> can be polled on any of them; pool processes
+write their progress to it directly.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from pdf_parser import PDFParser
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Finished jobs are forgotten after this many seconds
+JOB_RETENTION = 60 * 60
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        owner INTEGER NOT NULL,
+        created REAL NOT NULL,
+        finished REAL,
+        pages_done INTEGER,
+        pages_total INTEGER,
+        error TEXT,
+        details TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished);
+"""
+
+_local = threading.local()
+
+
+def _connect(path):
+    """Return this thread's connection to the jobs database, reconnecting after a fork"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid() or _local.path != path:
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _local.conn, _local.pid, _local.path = conn, os.getpid(), path
+    return conn
+
+
+def _process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def report_progress(path, job_id, pages_done, pages_total):
+    """Record the page progress of a job; called from the pool process running it"""
+    _connect(path).execute(
+        "UPDATE jobs SET status = 'running', pages_done = ?, pages_total = ? WHERE id = ? AND finished IS NULL",
+        (pages_done, pages_total, job_id)
+    )
+
+
+def extract_pdf_items(source, progress_callback=None):
+    """Extract study items from a PDF (path or bytes); also the worker entry point for batch uploads"""
+    # This already runs in a pool process, so pages are extracted here rather than in a nested pool
+    parser = PDFParser(source, progress_callback=progress_callback, workers=1)
+    items = parser.extract_items()
+    return {
+        'raw_text': parser.raw_text,
+        'items': items,
+        'processing_time': parser.processing_time
+    }
+
+
+def extract_pdf_job(job_id, jobs_path, source):
+    """Worker entry point: extract study items from a PDF (path or bytes), publishing page progress"""
+    def report(pages_done, pages_total):
+        report_progress(jobs_path, job_id, pages_done, pages_total)
+
+    return extract_pdf_items(source, progress_callback=report)
+
+
+class JobQueue:
+    """Runs jobs in a lazily created process pool and tracks their status in a shared SQLite table"""
+
+    def __init__(self, path, max_workers=None):
+        self.path = path
+        self.max_workers = max_workers or max(1, min(4, os.cpu_count() or 1))
+        self._executor = None
+        self._lock = threading.Lock()
+        _connect(self.path).executescript(SCHEMA)
+
+    def _ensure_pool(self):
+        """Start the pool on first use so forked server workers each get their own"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            logger.info(f"Started ingestion pool with {self.max_workers} workers")
+
+    def submit(self, fn, *args, on_complete=None, **info):
+        """
+        Queue fn(job_id, jobs_path, *args) in the pool and return the job id.
+        on_complete(result) runs in this process once the job succeeds; the dict it
+        returns is merged into the job record (e.g. the created session id).
+        """
+        job_id = str(uuid.uuid4())
+        conn = _connect(self.path)
+        conn.execute(
+            "INSERT INTO jobs (id, status, owner, created, details) VALUES (?, 'queued', ?, ?, ?)",
+            (job_id, os.getpid(), time.time(), json.dumps(info))
+        )
+
+        with self._lock:
+            self._prune(conn)
+            self._ensure_pool()
+            future = self._executor.submit(fn, job_id, self.path, *args)
+
+        def done(future):
+            details, status, error = dict(info), 'completed', None
+            try:
+                result = future.result()
+                if on_complete is not None:
+                    details.update(on_complete(result) or {})
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {str(e)}")
+                logger.error(traceback.format_exc())
+                status, error = 'failed', str(e)
+            _connect(self.path).execute(
+                'UPDATE jobs SET status = ?, finished = ?, error = ?, details = ? WHERE id = ?',
+                (status, time.time(), error, json.dumps(details), job_id)
+            )
+
+        future.add_done_callback(done)
+        return job_id
+
+    def run(self, fn, *args):
+        """Run fn(*args) in the pool without tracking it as a job; returns its Future"""
+        with self._lock:
+            self._ensure_pool()
+            return self._executor.submit(fn, *args)
+
+    def get(self, job_id):
+        """Return a snapshot of the job's status and progress, or None if unknown"""
+        row = _connect(self.path).execute(
+            'SELECT status, owner, created, finished, pages_done, pages_total, error, details FROM jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        status, owner, created, finished, pages_done, pages_total, error, details = row
+        if finished is None and not _process_exists(owner):
+            # The worker that queued the job exited without finishing it
+            status, finished, error = 'failed', time.time(), 'Job was interrupted'
+            _connect(self.path).execute(
+                'UPDATE jobs SET status = ?, finished = ?, error = ? WHERE id = ? AND finished IS NULL',
+                (status, finished, error, job_id)
+            )
+
+        job = dict(json.loads(details), job_id=job_id, status=status, created=created, error=error)
+        if finished is not None:
+            job['finished'] = finished
+        if pages_total is not None:
+            job['progress'] = {'pages_done': pages_done, 'pages_total': pages_total}
+        return job
+
+    def shutdown(self):
+        """Wait for queued jobs to finish and record their results, e.g. before a worker exits"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _prune(self, conn):
+        """Forget finished jobs past their retention period"""
+        conn.execute('DELETE FROM jobs WHERE finished < ?', (time.time() - JOB_RETENTION,))
@@ -0,0 +1,294 @@
+"""
+In-process metrics for TypeSpark, exposed in the Prometheus text format.
+Counters and histograms are recorded into per-thread shards, so recording takes
+no lock; shards are merged when metrics are read, and the shards of threads that
+have exited are folded into one retired shard. Each process writes a snapshot
+of its metrics to METRICS_DIR every few seconds, and a scrape adds up the
+snapshots of all processes (gunicorn workers and parser pool workers). Snapshots
+of processes that have exited are folded into an archive so counters keep counting.
+"""
+
+import os
+import json
+import time
+import atexit
+import bisect
+import logging
+import threading
+
+# fcntl is only available on POSIX systems; without it snapshots are merged without locking
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.environ.get('TYPESPARK_METRICS_DIR', 'metrics')
+
+# Seconds between snapshots of this process's metrics
+FLUSH_INTERVAL = 5
+
+ARCHIVE_FILE = 'archived.json'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 5 * 1024 * 1024, 10 * 1024 * 1024, 100 * 1024 * 1024)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'typespark_http_request_duration_seconds': ('histogram', 'Request latency by route', LATENCY_BUCKETS),
+    'typespark_upload_bytes_total': ('counter', 'Bytes received in uploaded files', None),
+    'typespark_upload_size_bytes': ('histogram', 'Size of uploaded files', SIZE_BUCKETS),
+    'typespark_pdf_pages_total': ('counter', 'PDF pages extracted', None),
+    'typespark_pdf_pages_per_second': ('histogram', 'PDF text extraction throughput per document', RATE_BUCKETS),
+    'typespark_extraction_seconds': ('histogram', 'Time spent extracting text and study items per document', LATENCY_BUCKETS),
+    'typespark_extraction_cache_requests_total': ('counter', 'Extraction cache lookups by result', None),
+}
+
+_local = threading.local()
+# (thread, shard) for every thread that has recorded a metric and is still running
+_shards = []
+# Metrics recorded by threads that have exited
+_retired = {'counters': {}, 'histograms': {}}
+_shards_lock = threading.Lock()
+_flusher = None
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _shard():
+    """Return this thread's shard, registering it (and starting the flusher) on first use"""
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = {'counters': {}, 'histograms': {}}
+        with _shards_lock:
+            _shards.append((threading.current_thread(), shard))
+            _local.shard = shard
+            _start_flusher()
+    return shard
+
+
+def inc(name, value=1, **labels):
+    """Add value to a counter"""
+    counters = _shard()['counters']
+    key = (name, _labels_key(labels))
+    counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """Record a value in a histogram"""
+    histograms = _shard()['histograms']
+    key = (name, _labels_key(labels))
+    buckets = METRICS[name][2]
+    histogram = histograms.get(key)
+    if histogram is None:
+        # One count per bucket plus +Inf, then sum and count
+        histogram = histograms[key] = [0] * (len(buckets) + 3)
+    histogram[bisect.bisect_left(buckets, value)] += 1
+    histogram[-2] += value
+    histogram[-1] += 1
+
+
+def _retire_exited():
+    """
+    Fold the shards of exited threads into the retired shard, so threads that come
+    and go do not leave a shard each behind. Caller holds _shards_lock.
+    """
+    global _shards
+    running = []
+    for thread, shard in _shards:
+        if thread.is_alive():
+            running.append((thread, shard))
+            continue
+        # The thread has exited, so nothing writes to its shard any more
+        for key, value in shard['counters'].items():
+            _retired['counters'][key] = _retired['counters'].get(key, 0) + value
+        for key, values in shard['histograms'].items():
+            _add_histogram(_retired['histograms'], key, list(values))
+    _shards = running
+
+
+def snapshot():
+    """Merge the shards of all threads into {'counters': [...], 'histograms': [...]}"""
+    with _shards_lock:
+        _retire_exited()
+        shards = [shard for _, shard in _shards]
+        counters = dict(_retired['counters'])
+        histograms = {key: list(values) for key, values in _retired['histograms'].items()}
+    for shard in shards:
+        # list() copies a dict without releasing the GIL, so writers cannot resize it meanwhile
+        for key, value in list(shard['counters'].items()):
+            counters[key] = counters.get(key, 0) + value
+        for key, values in list(shard['histograms'].items()):
+            _add_histogram(histograms, key, list(values))
+    return _to_json(counters, histograms)
+
+
+def _add_histogram(histograms, key, values):
+    total = histograms.get(key)
+    if total is None:
+        histograms[key] = values
+    else:
+        for i, value in enumerate(values):
+            total[i] += value
+
+
+def _to_json(counters, histograms):
+    return {
+        'counters': [[name, list(map(list, labels)), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(map(list, labels)), values] for (name, labels), values in histograms.items()]
+    }
+
+
+def _merge_into(counters, histograms, data):
+    for name, labels, value in data.get('counters', []):
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, values in data.get('histograms', []):
+        _add_histogram(histograms, (name, tuple(map(tuple, labels))), values)
+
+
+def _write_json(path, data):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR"""
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _write_json(os.path.join(METRICS_DIR, f"{os.getpid()}.json"), snapshot())
+    except Exception as e:
+        logger.warning(f"Error writing metrics snapshot: {str(e)}")
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush()
+
+
+def _start_flusher():
+    """Start the snapshot thread for this process. Caller holds _shards_lock."""
+    global _flusher
+    if _flusher is None:
+        _flusher = threading.Thread(target=_flush_loop, daemon=True)
+        _flusher.start()
+
+
+def _after_fork():
+    """A forked child starts with no metrics of its own and no snapshot thread"""
+    global _local, _shards, _retired, _shards_lock, _flusher
+    _local = threading.local()
+    _shards = []
+    _retired = {'counters': {}, 'histograms': {}}
+    _shards_lock = threading.Lock()
+    _flusher = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+atexit.register(lambda: _flusher is not None and flush())
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collect():
+    """
+    Add up the metrics of all processes: the archive, the snapshots of other live
+    processes and this process's current shards. Snapshots left by exited
+    processes are merged into the archive.
+    """
+    counters = {}
+    histograms = {}
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    lock_fd = os.open(os.path.join(METRICS_DIR, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        archive_path = os.path.join(METRICS_DIR, ARCHIVE_FILE)
+        archived_counters, archived_histograms = {}, {}
+        _merge_into(archived_counters, archived_histograms, _read_json(archive_path))
+        exited = []
+        for filename in os.listdir(METRICS_DIR):
+            pid = filename[:-len('.json')]
+            if not filename.endswith('.json') or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            path = os.path.join(METRICS_DIR, filename)
+            if _alive(int(pid)):
+                _merge_into(counters, histograms, _read_json(path))
+            else:
+                _merge_into(archived_counters, archived_histograms, _read_json(path))
+                exited.append(path)
+        if exited:
+            _write_json(archive_path, _to_json(archived_counters, archived_histograms))
+            for path in exited:
+                os.remove(path)
+    finally:
+        os.close(lock_fd)
+
+    _merge_into(counters, histograms, _to_json(archived_counters, archived_histograms))
+    _merge_into(counters, histograms, snapshot())
+    return counters, histograms
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+def render(gauges=None):
+    """
+    Render all metrics in the Prometheus text format. gauges maps a name to
+    (help, value) for point-in-time values read at scrape time.
+    """
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            continue
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+    for name, (help_text, value) in (gauges or {}).items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return '\n'.join(lines) + '\n'
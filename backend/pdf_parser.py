@@ -4,13 +4,19 @@ This version works with both PyMuPDF (fitz) and PyPDF2 as fallback.
 It includes critical performance optimizations to prevent long loading times.
 """
 
+import io
 import os
 import re
-import uuid
+import atexit
 import platform
 import logging
 import time
 import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+
+import metrics
+from study_items import make_item
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -54,146 +60,184 @@ try:
 except ImportError:
     logger.warning("PyPDF2 not available.")
 
+# Control characters stripped from extracted page text
+CONTROL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xff]')
+
+# Parallel extraction: pages are split into fixed-size ranges, one worker process per range
+PAGE_WORKERS = max(1, min(8, os.cpu_count() or 1))
+PAGES_PER_SHARD = 10
+PARALLEL_MAX_PAGES = 200
+# Extra time allowed for a shard to return after the shared deadline has passed
+SHARD_GRACE_SECONDS = 5
+
+_page_pool = None
+
+def _get_page_pool(workers):
+    """Return the process pool used for page extraction, creating it on first use"""
+    global _page_pool
+    if _page_pool is None:
+        _page_pool = ProcessPoolExecutor(max_workers=workers)
+    return _page_pool
+
+def _shutdown_page_pool():
+    """Stop the page workers on exit so the interpreter does not wait on an idle pool"""
+    global _page_pool
+    if _page_pool is not None:
+        _page_pool.shutdown(wait=False, cancel_futures=True)
+        _page_pool = None
+
+def _forget_page_pool():
+    """
+    A forked child (a job pool worker or a gunicorn worker) inherits the pool object
+    but not its management thread or worker pipes; submitting to it would hang, so
+    the child starts its own pool if it needs one.
+    """
+    global _page_pool
+    _page_pool = None
+
+atexit.register(_shutdown_page_pool)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_page_pool)
+
+def _open_document(source):
+    """Open a PyMuPDF document from a file path or from the PDF's bytes"""
+    if isinstance(source, bytes):
+        return fitz.open(stream=source, filetype='pdf')
+    return fitz.open(source)
+
+def _extract_page_range(source, first_page, last_page, deadline, max_content_size):
+    """
+    Worker entry point: extract cleaned text for pages [first_page, last_page).
+    Each worker opens its own document (from a path or the PDF's bytes) and stops
+    at the shared deadline or once the shard alone exceeds the content size budget.
+    Returns (page_texts, timed_out).
+    """
+    page_texts = []
+    text_size = 0
+    with _open_document(source) as doc:
+        for page_idx in range(first_page, last_page):
+            if time.time() > deadline:
+                return page_texts, True
+            try:
+                page_text = CONTROL_CHARS.sub('', doc[page_idx].get_text("text"))
+            except Exception as e:
+                logger.error(f"Error processing page {page_idx}: {str(e)}")
+                continue
+            page_texts.append(page_text)
+            text_size += len(page_text)
+            if text_size > max_content_size:
+                break
+    return page_texts, False
+
+# Maximum number of study items extracted per category from one document
+ITEM_LIMITS = {'definition': 15, 'paragraph': 10, 'key_concept': 5, 'list': 3}
+
+# Size at which a streamed block without paragraph breaks is flushed at a line break
+STREAM_FLUSH_SIZE = 8 * 1024
+
+# Longest paragraph item; longer blocks are split into several passages
+PARAGRAPH_MAX_LENGTH = 500
+
+# Study item heuristics, compiled once and applied together in one pass over the paragraphs
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+DEFINITION_PATTERN = re.compile(r'([A-Z][a-zA-Z\s]{2,40})(?::|-)([^\.]+\.)')
+LIST_PATTERN = re.compile(r'(?:\d+\.\s*[^\n]+\n){2,}|(?:[•\-\*]\s*[^\n]+\n){2,}')
+KEY_PHRASES = ("important", "key concept", "remember", "critical", "note that")
+# One alternation finds any key phrase in a single case-insensitive scan of a sentence
+KEY_PHRASE_PATTERN = re.compile('|'.join(re.escape(phrase) for phrase in KEY_PHRASES), re.IGNORECASE)
+
+# Bump whenever a change alters the text or items produced for the same PDF,
+# so stale entries in the extraction cache are not reused
+EXTRACTION_VERSION = 4
+
 class PDFParser:
     """Parser to extract study content from PDFs with improved version compatibility and performance"""
     
-    def __init__(self, pdf_path):
-        self.pdf_path = pdf_path
+    def __init__(self, source, progress_callback=None, workers=None):
+        # A PDF is parsed from a file path, or straight from its bytes (e.g. an upload buffer)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self.source = bytes(source)
+            self.pdf_path = None
+        else:
+            self.source = source
+            self.pdf_path = source
         self.raw_text = ""
         self.processing_time = 0
-        logger.info(f"Initializing PDF parser for: {pdf_path}")
+        self.pages_processed = 0
+        # Optional callable(pages_done, pages_total) invoked from the page loop
+        self.progress_callback = progress_callback
+        logger.info(f"Initializing PDF parser for: {self.pdf_path or 'in-memory PDF'}")
         
-        # Check if file exists
-        if not os.path.exists(self.pdf_path):
-            logger.error(f"File not found: {self.pdf_path}")
-            return
-            
         # Maximum content size to prevent memory issues (50KB)
         self.max_content_size = 50 * 1024
         
-        # Maximum pages to process
-        self.max_pages = 10
+        # Worker processes for page extraction (PyMuPDF only)
+        self.workers = workers or PAGE_WORKERS
+        
+        # Maximum pages to process. PyMuPDF is fast enough for the larger budget even in one
+        # process (the timeout still applies), so the page count and the extraction cache
+        # key do not depend on the worker count.
+        self.max_pages = PARALLEL_MAX_PAGES if HAS_PYMUPDF else 10
         
         # Processing timeout in seconds
         self.timeout = 30
+        
+        # Check if file exists
+        if self.pdf_path is not None and not os.path.exists(self.pdf_path):
+            logger.error(f"File not found: {self.pdf_path}")
+    
+    def cache_settings(self, streaming=False):
+        """
+        Return the settings that affect extraction output, used to key the extraction cache.
+        iter_items() yields items in page order rather than extract_items() order, so
+        streamed extractions are cached under their own key.
+        """
+        settings = {
+            'extraction_version': EXTRACTION_VERSION,
+            'max_content_size': self.max_content_size,
+            'max_pages': self.max_pages,
+            'pymupdf': HAS_PYMUPDF,
+            'pypdf2': HAS_PYPDF2
+        }
+        if streaming:
+            settings['item_order'] = 'stream'
+        return settings
+    
+    def _record_metrics(self, phase):
+        """Record extraction time and page throughput once a document has been extracted"""
+        metrics.observe('typespark_extraction_seconds', self.processing_time, phase=phase)
+        if self.pages_processed:
+            metrics.inc('typespark_pdf_pages_total', self.pages_processed)
+            if self.processing_time > 0:
+                metrics.observe('typespark_pdf_pages_per_second', self.pages_processed / self.processing_time)
+    
+    def _report_progress(self, pages_done, pages_total):
+        """Forward page progress to the progress callback, never failing the extraction"""
+        if self.progress_callback is None:
+            return
+        try:
+            self.progress_callback(pages_done, pages_total)
+        except Exception as e:
+            logger.warning(f"Progress callback failed: {str(e)}")
     
     def extract_text(self):
         """Extract text from the PDF, handling different PDF libraries with performance optimizations"""
-        if not os.path.exists(self.pdf_path):
+        if self.pdf_path is not None and not os.path.exists(self.pdf_path):
             logger.error(f"File not found: {self.pdf_path}")
             return self
         
         # Get file size
-        file_size = os.path.getsize(self.pdf_path)
+        file_size = len(self.source) if self.pdf_path is None else os.path.getsize(self.pdf_path)
         logger.info(f"PDF file size: {file_size / 1024:.2f} KB")
         
         # Start timing
         start_time = time.time()
         
         try:
-            if HAS_PYMUPDF:
-                logger.info("Extracting text with PyMuPDF")
-                # Use PyMuPDF if available - the most efficient option
-                with fitz.open(self.pdf_path) as doc:
-                    # Get total pages
-                    total_pages = len(doc)
-                    logger.info(f"PDF has {total_pages} pages, limiting to {self.max_pages}")
-                    
-                    # Set up progress tracking
-                    page_count = 0
-                    total_text_size = 0
-                    timeout_reached = False
-                    
-                    # Extract text from each page, with limits
-                    for page_idx, page in enumerate(doc):
-                        # Check processing time for timeout
-                        current_time = time.time()
-                        if current_time - start_time > self.timeout:
-                            logger.warning(f"Processing timeout reached after {self.timeout} seconds")
-                            self.raw_text += "\n\n[Processing timeout: document too complex]"
-                            timeout_reached = True
-                            break
-                            
-                        # Check if we've reached the max pages
-                        if page_idx >= self.max_pages:
-                            self.raw_text += "\n\n[Content truncated: only first 10 pages processed for performance]"
-                            break
-                            
-                        # Extract text and add to raw_text
-                        try:
-                            page_text = page.get_text("text")
-                            # Clean the text slightly - handle common issues
-                            page_text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xff]', '', page_text)
-                            self.raw_text += page_text
-                            page_count += 1
-                            total_text_size += len(page_text)
-                        except Exception as e:
-                            logger.error(f"Error processing page {page_idx}: {str(e)}")
-                            continue
-                            
-                        # Check if we've reached our content size limit
-                        if len(self.raw_text) > self.max_content_size:
-                            self.raw_text = self.raw_text[:self.max_content_size]
-                            self.raw_text += "\n\n[Content truncated: maximum content size reached]"
-                            break
-                            
-                        # Log progress periodically
-                        if page_idx % 5 == 0 and page_idx > 0:
-                            logger.info(f"Processed {page_idx} pages so far")
-                            
-                    if not timeout_reached:
-                        logger.info(f"Extracted {len(self.raw_text)} characters from {page_count} pages with PyMuPDF")
-            elif HAS_PYPDF2:
-                logger.info("Extracting text with PyPDF2")
-                # Use PyPDF2 as fallback
-                with open(self.pdf_path, 'rb') as file:
-                    try:
-                        reader = PdfReader(file)
-                        total_pages = len(reader.pages)
-                        logger.info(f"PDF has {total_pages} pages, limiting to {self.max_pages}")
-                        
-                        # Set up progress tracking
-                        page_count = 0
-                        timeout_reached = False
-                        
-                        # Extract text with page limit
-                        for page_idx, page in enumerate(reader.pages):
-                            # Check processing time for timeout
-                            current_time = time.time()
-                            if current_time - start_time > self.timeout:
-                                logger.warning(f"Processing timeout reached after {self.timeout} seconds")
-                                self.raw_text += "\n\n[Processing timeout: document too complex]"
-                                timeout_reached = True
-                                break
-                                
-                            # Check if we've reached the max pages
-                            if page_idx >= self.max_pages:
-                                self.raw_text += "\n\n[Content truncated: only first 10 pages processed for performance]"
-                                break
-                                
-                            # Extract text and add to raw_text
-                            try:
-                                page_text = page.extract_text()
-                                # Clean the text slightly
-                                if page_text:
-                                    page_text = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xff]', '', page_text)
-                                    self.raw_text += page_text + "\n\n"
-                                    page_count += 1
-                            except Exception as e:
-                                logger.error(f"Error processing page {page_idx}: {str(e)}")
-                                continue
-                                
-                            # Check if we've reached our content size limit
-                            if len(self.raw_text) > self.max_content_size:
-                                self.raw_text = self.raw_text[:self.max_content_size]
-                                self.raw_text += "\n\n[Content truncated: maximum content size reached]"
-                                break
-                                
-                        if not timeout_reached:
-                            logger.info(f"Extracted {len(self.raw_text)} characters from {page_count} pages with PyPDF2")
-                    except Exception as e:
-                        logger.error(f"Error with PyPDF2 processing: {str(e)}")
-                        self.raw_text = f"ERROR EXTRACTING TEXT: {str(e)}"
+            if HAS_PYMUPDF or HAS_PYPDF2:
+                # Join once at the end instead of growing the string page by page
+                self.raw_text = "".join(self.iter_pages())
+                logger.info(f"Extracted {len(self.raw_text)} characters from PDF")
             else:
                 # No PDF library available
                 error_msg = "PDF SUPPORT NOT AVAILABLE. Please install PyMuPDF or PyPDF2."
@@ -209,9 +253,158 @@ class PDFParser:
         end_time = time.time()
         self.processing_time = end_time - start_time
         logger.info(f"PDF processing took {self.processing_time:.2f} seconds")
+        self._record_metrics('text')
         
         return self
     
+    def iter_pages(self):
+        """
+        Yield cleaned page text as each page is extracted, applying the page, content size
+        and timeout budgets. Truncation and timeout notices are yielded as trailing text.
+        """
+        deadline = time.time() + self.timeout
+        
+        if HAS_PYMUPDF:
+            logger.info("Extracting text with PyMuPDF")
+            # Use PyMuPDF if available - the most efficient option
+            with _open_document(self.source) as doc:
+                total_pages = len(doc)
+                logger.info(f"PDF has {total_pages} pages, limiting to {self.max_pages}")
+                pages_to_process = min(total_pages, self.max_pages)
+                
+                if self.workers > 1 and pages_to_process > PAGES_PER_SHARD:
+                    # Large documents are sharded across worker processes
+                    pages = self._parallel_pages(pages_to_process, deadline)
+                else:
+                    pages = self._pymupdf_pages(doc, pages_to_process, deadline)
+                yield from self._apply_budgets(pages, total_pages, pages_to_process)
+        elif HAS_PYPDF2:
+            logger.info("Extracting text with PyPDF2")
+            # Use PyPDF2 as fallback
+            with (io.BytesIO(self.source) if self.pdf_path is None else open(self.pdf_path, 'rb')) as file:
+                reader = PdfReader(file)
+                total_pages = len(reader.pages)
+                logger.info(f"PDF has {total_pages} pages, limiting to {self.max_pages}")
+                pages_to_process = min(total_pages, self.max_pages)
+                
+                pages = self._pypdf2_pages(reader, pages_to_process, deadline)
+                yield from self._apply_budgets(pages, total_pages, pages_to_process)
+        else:
+            raise RuntimeError("PDF SUPPORT NOT AVAILABLE. Please install PyMuPDF or PyPDF2.")
+    
+    def _apply_budgets(self, pages, total_pages, pages_to_process):
+        """Pass page text through, stopping at the timeout or content size limit and reporting progress"""
+        self._report_progress(0, pages_to_process)
+        page_count = 0
+        text_size = 0
+        
+        try:
+            for page_text in pages:
+                # A None page signals that the processing deadline was reached
+                if page_text is None:
+                    logger.warning(f"Processing timeout reached after {self.timeout} seconds")
+                    yield "\n\n[Processing timeout: document too complex]"
+                    return
+                
+                page_count += 1
+                self.pages_processed = page_count
+                self._report_progress(page_count, pages_to_process)
+                
+                # Check if we've reached our content size limit
+                if text_size + len(page_text) > self.max_content_size:
+                    yield page_text[:self.max_content_size - text_size]
+                    yield "\n\n[Content truncated: maximum content size reached]"
+                    return
+                
+                text_size += len(page_text)
+                yield page_text
+                
+                # Log progress periodically
+                if page_count % 5 == 0:
+                    logger.info(f"Processed {page_count} pages so far")
+            
+            if total_pages > self.max_pages:
+                yield f"\n\n[Content truncated: only first {self.max_pages} pages processed for performance]"
+        finally:
+            # Stop any outstanding work in the page source
+            pages.close()
+    
+    def _pymupdf_pages(self, doc, pages_to_process, deadline):
+        """Yield cleaned text page by page from an open PyMuPDF document"""
+        for page_idx in range(pages_to_process):
+            # Check processing time for timeout
+            if time.time() > deadline:
+                yield None
+                return
+            
+            try:
+                page_text = doc[page_idx].get_text("text")
+                # Clean the text slightly - handle common issues
+                yield CONTROL_CHARS.sub('', page_text)
+            except Exception as e:
+                logger.error(f"Error processing page {page_idx}: {str(e)}")
+    
+    def _pypdf2_pages(self, reader, pages_to_process, deadline):
+        """Yield cleaned text page by page from a PyPDF2 reader, skipping empty pages"""
+        for page_idx in range(pages_to_process):
+            # Check processing time for timeout
+            if time.time() > deadline:
+                yield None
+                return
+            
+            try:
+                page_text = reader.pages[page_idx].extract_text()
+            except Exception as e:
+                logger.error(f"Error processing page {page_idx}: {str(e)}")
+                continue
+            
+            # Clean the text slightly
+            if page_text:
+                yield CONTROL_CHARS.sub('', page_text) + "\n\n"
+    
+    def _parallel_pages(self, pages_to_process, deadline):
+        """
+        Yield page text in page order while worker processes extract page ranges in parallel.
+        About one shard per worker is in flight, and the next is submitted as one is consumed,
+        so once the content budget stops the consumer no further pages are extracted.
+        """
+        shards = [(first, min(first + PAGES_PER_SHARD, pages_to_process))
+                  for first in range(0, pages_to_process, PAGES_PER_SHARD)]
+        logger.info(f"Sharding {pages_to_process} pages into {len(shards)} ranges across {self.workers} workers")
+        
+        pool = _get_page_pool(self.workers)
+        pending = iter(shards)
+        in_flight = deque()
+        
+        def submit_next():
+            shard = next(pending, None)
+            if shard is not None:
+                in_flight.append(pool.submit(_extract_page_range, self.source, shard[0], shard[1],
+                                             deadline, self.max_content_size))
+        
+        for _ in range(self.workers):
+            submit_next()
+        
+        try:
+            # Consume shards in page order so budgets truncate at the same place as a sequential run
+            while in_flight:
+                future = in_flight.popleft()
+                try:
+                    shard_texts, timed_out = future.result(timeout=max(deadline - time.time(), 0) + SHARD_GRACE_SECONDS)
+                except FuturesTimeoutError:
+                    timed_out, shard_texts = True, []
+                if timed_out:
+                    yield from shard_texts
+                    yield None
+                    return
+                # Keep every worker busy while this shard's pages are consumed
+                submit_next()
+                yield from shard_texts
+        finally:
+            # Drop shards that are no longer needed
+            for future in in_flight:
+                future.cancel()
+    
     def extract_items(self):
         """Process PDF and extract study items with performance optimizations"""
         # Extract text if not already done
@@ -222,13 +415,12 @@ class PDFParser:
         
         # If extraction failed with an error message, return a study item with the error
         if self.raw_text.startswith("ERROR EXTRACTING TEXT") or self.raw_text.startswith("PDF SUPPORT NOT AVAILABLE"):
-            items.append({
-                'id': str(uuid.uuid4()),
-                'prompt': "Error processing PDF:",
-                'content': self.raw_text,
-                'type': 'error',
-                'context': 'Error'
-            })
+            items.append(make_item(
+                "Error processing PDF:",
+                self.raw_text,
+                'error',
+                'Error'
+            ))
             return items
         
         # Start timing item extraction
@@ -236,45 +428,18 @@ class PDFParser:
         
         # If the content is empty or very short, create a simple item
         if not self.raw_text or len(self.raw_text) < 50:
-            items.append({
-                'id': str(uuid.uuid4()),
-                'prompt': "No text content found in PDF:",
-                'content': "This PDF appears to be empty or contains no extractable text. It may be an image-based PDF that requires OCR processing.",
-                'type': 'error',
-                'context': 'Empty Content'
-            })
-            return items
-            
-        # For very large content, just split into chunks rather than trying complex parsing
-        if len(self.raw_text) > 30000:
-            logger.info("Content is large, using simple chunk splitting for performance")
-            chunks = self._split_into_chunks(self.raw_text, 500)
-            for i, chunk in enumerate(chunks[:20]):  # Limit to 20 chunks
-                if len(chunk.strip()) > 50:  # Only include meaningful chunks
-                    items.append({
-                        'id': str(uuid.uuid4()),
-                        'prompt': f"Type this text (part {i+1}/{min(len(chunks), 20)}):",
-                        'content': chunk,
-                        'type': 'text',
-                        'context': 'PDF Content'
-                    })
-            
-            logger.info(f"Created {len(items)} chunks from large content")
+            items.append(make_item(
+                "No text content found in PDF:",
+                "This PDF appears to be empty or contains no extractable text. It may be an image-based PDF that requires OCR processing.",
+                'error',
+                'Empty Content'
+            ))
             return items
         
-        # For smaller content, try regular extraction methods, but with timeouts
+        # Definitions, paragraphs, key concepts and lists in one pass; the scan stops
+        # once every category has reached its limit, so large documents need no cap
         try:
-            # Extract definitions (term-definition pairs)
-            items.extend(self._extract_definitions())
-            
-            # Extract paragraphs for general typing practice
-            items.extend(self._extract_paragraphs())
-            
-            # Extract key concepts based on formatting hints
-            items.extend(self._extract_key_concepts())
-            
-            # Extract lists (numbered or bulleted)
-            items.extend(self._extract_lists())
+            items = self._scan_items(self.raw_text, dict(ITEM_LIMITS))
         except Exception as e:
             logger.error(f"Error during item extraction: {str(e)}")
             logger.error(traceback.format_exc())
@@ -284,240 +449,230 @@ class PDFParser:
         # If no items were found or an error occurred, create a simple one with the raw text
         if not items:
             # Split into manageable chunks
-            chunks = self._split_into_chunks(self.raw_text, 500)
-            for i, chunk in enumerate(chunks[:10]):  # Limit to 10 chunks
+            # Chunk boundaries are cheap offsets; only the chunks used are sliced out
+            bounds = list(self._iter_chunk_bounds(self.raw_text, 500))
+            for i, (chunk_start, chunk_end) in enumerate(bounds[:10]):  # Limit to 10 chunks
+                chunk = self.raw_text[chunk_start:chunk_end]
                 if len(chunk.strip()) > 50:  # Only include meaningful chunks
-                    items.append({
-                        'id': str(uuid.uuid4()),
-                        'prompt': f"Type this text (part {i+1}/{min(len(chunks), 10)}):",
-                        'content': chunk,
-                        'type': 'text',
-                        'context': 'PDF Content'
-                    })
+                    items.append(make_item(
+                        f"Type this text (part {i+1}/{min(len(bounds), 10)}):",
+                        chunk,
+                        'text',
+                        'PDF Content'
+                    ))
         
         # Log extraction time
         end_time = time.time()
         logger.info(f"Item extraction took {end_time - start_time:.2f} seconds, found {len(items)} items")
+        metrics.observe('typespark_extraction_seconds', end_time - start_time, phase='items')
         
         return items
     
-    def _split_into_chunks(self, text, max_length):
-        """Split text into chunks of approximately max_length characters, trying to break at paragraph or sentence boundaries"""
-        if len(text) <= max_length:
-            return [text]
-            
-        chunks = []
-        remaining = text
-        
-        # Safety counter to prevent infinite loops
-        max_iterations = 1000
-        iteration = 0
+    def iter_items(self):
+        """
+        Yield study items as pages are extracted, so the first items are ready before the
+        rest of the document has been parsed. raw_text is set once extraction finishes.
+        """
+        start_time = time.time()
+        page_texts = []
+        pending = ""
+        item_count = 0
+        # Per-category item limits, shared across all blocks of the document
+        remaining = dict(ITEM_LIMITS)
         
-        while len(remaining) > 0 and iteration < max_iterations:
-            iteration += 1
+        try:
+            if not (HAS_PYMUPDF or HAS_PYPDF2):
+                raise RuntimeError("PDF SUPPORT NOT AVAILABLE. Please install PyMuPDF or PyPDF2.")
             
-            if len(remaining) <= max_length:
-                chunks.append(remaining)
-                break
+            for page_text in self.iter_pages():
+                page_texts.append(page_text)
+                pending += page_text
                 
-            # Try to find a paragraph break
-            para_break = remaining.rfind('\n\n', 0, max_length)
+                # Only scan complete paragraphs; the tail may continue on the next page
+                boundary = self._stream_boundary(pending)
+                if boundary:
+                    for item in self._extract_block(pending[:boundary], remaining):
+                        item_count += 1
+                        yield item
+                    pending = pending[boundary:]
             
-            if para_break != -1:
-                # Found paragraph break
-                chunks.append(remaining[:para_break].strip())
-                remaining = remaining[para_break:].strip()
+            for item in self._extract_block(pending, remaining):
+                item_count += 1
+                yield item
+            self.raw_text = "".join(page_texts)
+        except Exception as e:
+            error_str = str(e)
+            logger.error(f"Error extracting text from PDF: {error_str}")
+            logger.error(traceback.format_exc())
+            if error_str.startswith("PDF SUPPORT NOT AVAILABLE"):
+                self.raw_text = error_str
             else:
-                # Try to find sentence break (period followed by space)
-                sentence_break = remaining.rfind('. ', 0, max_length)
-                
-                if sentence_break != -1 and sentence_break > max_length // 2:
-                    # Found good sentence break
-                    chunks.append(remaining[:sentence_break+1].strip())
-                    remaining = remaining[sentence_break+1:].strip()
-                else:
-                    # Just break at maximum length
-                    chunks.append(remaining[:max_length].strip())
-                    remaining = remaining[max_length:].strip()
-        
-        return chunks
-    
-    def _extract_definitions(self):
-        """Extract term-definition pairs with timeout protection"""
-        if not self.raw_text:
-            return []
+                self.raw_text = f"ERROR EXTRACTING TEXT: {error_str}"
             
-        items = []
+            # Items already served stay valid; only report the error if nothing was found
+            if not item_count:
+                yield make_item(
+                    "Error processing PDF:",
+                    self.raw_text,
+                    'error',
+                    'Error'
+                )
+            return
+        finally:
+            self.processing_time = time.time() - start_time
+            self._record_metrics('stream')
         
-        # Simplified pattern for better performance
-        definition_pattern = r'([A-Z][a-zA-Z\s]{2,40})(?::|-)([^\.]+\.)'
+        if not item_count:
+            # Nothing matched the heuristics, fall back to the same output as extract_items
+            for item in self.extract_items():
+                yield item
         
-        try:
-            # Limit processing to a reasonable size
-            text_to_process = self.raw_text[:30000]
-            
-            matches = re.findall(definition_pattern, text_to_process)
-            
-            # Limit the number of definitions to prevent performance issues
-            for term, definition in matches[:15]:
-                term = term.strip()
-                definition = definition.strip()
-                
-                # Create a study item for term->definition
-                if len(term) > 2 and len(definition) > 10:
-                    items.append({
-                        'id': str(uuid.uuid4()),
-                        'prompt': f"Define the term: {term}",
-                        'content': definition,
-                        'type': 'definition',
-                        'context': 'Terminology'
-                    })
-        except Exception as e:
-            logger.error(f"Error extracting definitions: {str(e)}")
-        
-        return items
+        logger.info(f"Streamed {item_count} items in {self.processing_time:.2f} seconds")
     
-    def _extract_paragraphs(self):
-        """Extract paragraphs for typing practice with performance enhancements"""
-        if not self.raw_text:
+    @staticmethod
+    def _stream_boundary(text):
+        """Return the offset after the last paragraph break in text (or a line break once text is large)"""
+        boundary = text.rfind('\n\n')
+        if boundary == -1 and len(text) > STREAM_FLUSH_SIZE:
+            boundary = text.rfind('\n')
+        return boundary + 1 if boundary != -1 else 0
+    
+    def _extract_block(self, text, remaining):
+        """Run the item heuristics over a block of text within the remaining per-category limits"""
+        if not text.strip():
             return []
-            
-        items = []
         
         try:
-            # Limit processing to a reasonable size
-            text_to_process = self.raw_text[:30000]
-            
-            # Split text into paragraphs
-            paragraphs = re.split(r'\n\s*\n', text_to_process)
-            
-            # Limit the number of paragraphs to prevent performance issues
-            paragraph_count = 0
-            for paragraph in paragraphs:
-                # Skip after processing enough paragraphs
-                if paragraph_count >= 10:
-                    break
-                    
-                # Clean up the paragraph
-                paragraph = paragraph.strip()
-                
-                # Skip very short paragraphs or chapter markers
-                if len(paragraph) < 50 or len(paragraph.split()) < 10:
-                    continue
-                
-                # Create a study item
-                items.append({
-                    'id': str(uuid.uuid4()),
-                    'prompt': "Type this paragraph:",
-                    'content': paragraph,
-                    'type': 'paragraph',
-                    'context': 'Content'
-                })
-                
-                paragraph_count += 1
+            return self._scan_items(text, remaining)
         except Exception as e:
-            logger.error(f"Error extracting paragraphs: {str(e)}")
-        
-        return items
-    
-    def _extract_key_concepts(self):
-        """Extract key concepts based on formatting hints with performance enhancements"""
-        if not self.raw_text:
+            logger.error(f"Error during item extraction: {str(e)}")
             return []
-            
-        items = []
+    
+    @staticmethod
+    def _iter_chunk_bounds(text, max_length):
+        """
+        Yield (start, end) offsets of chunks of approximately max_length characters,
+        trying to break at paragraph or sentence boundaries. Works on offsets into
+        text, so splitting is linear in its length and nothing is dropped.
+        """
+        if len(text) <= max_length:
+            yield 0, len(text)
+            return
         
-        try:
-            # Limit processing to a reasonable size
-            text_to_process = self.raw_text[:20000]
+        def skip_space(position, limit):
+            while position < limit and text[position].isspace():
+                position += 1
+            return position
+        
+        def trim_space(position, limit):
+            while position > limit and text[position - 1].isspace():
+                position -= 1
+            return position
+        
+        # The text is only right-trimmed after the first chunk has been cut
+        start, end = 0, len(text)
+        trimmed_end = trim_space(end, 0)
+        while start < end:
+            if end - start <= max_length:
+                yield start, end
+                break
             
-            # Look for sentences with key indicator phrases
-            key_phrases = ["important", "key concept", "remember", "critical", "note that"]
-            sentences = re.split(r'\.', text_to_process)
+            window_end = start + max_length
+            # Try to find a paragraph break
+            cut = text.rfind('\n\n', start, window_end)
+            if cut == -1:
+                # Try to find sentence break (period followed by space), else break at maximum length
+                cut = text.rfind('. ', start, window_end)
+                cut = cut + 1 if cut != -1 and cut - start > max_length // 2 else window_end
             
-            # Limit number of concepts
-            concept_count = 0
-            for sentence in sentences:
-                # Stop after finding enough concepts
-                if concept_count >= 5:
-                    break
-                    
-                for phrase in key_phrases:
-                    if phrase.lower() in sentence.lower():
-                        # Found a potential key concept
-                        concept = sentence.strip()
-                        if len(concept) > 20:  # Ensure it's meaningful
-                            items.append({
-                                'id': str(uuid.uuid4()),
-                                'prompt': "Type this key concept:",
-                                'content': concept,
-                                'type': 'key_concept',
-                                'context': 'Key Concepts'
-                            })
-                            concept_count += 1
-                            break  # Move to next sentence after finding a concept
-        except Exception as e:
-            logger.error(f"Error extracting key concepts: {str(e)}")
-        
-        return items
+            chunk_start = skip_space(start, cut)
+            yield chunk_start, trim_space(cut, chunk_start)
+            end = trimmed_end
+            start = skip_space(cut, end)
     
-    def _extract_lists(self):
-        """Extract numbered or bulleted lists with performance enhancements"""
-        if not self.raw_text:
-            return []
-            
-        items = []
+    def _scan_items(self, text, remaining):
+        """
+        Extract definitions, paragraphs, key concepts and lists from text in a single
+        pass over its paragraphs, within the per-category limits in remaining (which
+        are decremented). Items are returned grouped by category in that order.
+        """
+        definitions, paragraphs, concepts, lists = [], [], [], []
+        definition_limit = remaining['definition']
+        paragraph_limit = remaining['paragraph']
+        concept_limit = remaining['key_concept']
+        list_limit = remaining['list']
         
-        try:
-            # Limit processing to a reasonable size
-            text_to_process = self.raw_text[:20000]
+        start = 0
+        breaks = PARAGRAPH_BREAK.finditer(text)
+        while start is not None and (len(definitions) < definition_limit or len(paragraphs) < paragraph_limit or
+                                     len(concepts) < concept_limit or len(lists) < list_limit):
+            # Keep the newline ending the block's last line so list lines stay terminated
+            paragraph_break = next(breaks, None)
+            if paragraph_break is not None:
+                block, start = text[start:paragraph_break.start() + 1], paragraph_break.end()
+            else:
+                block, start = text[start:], None
             
-            # Match numbered lists (e.g., "1. Item\n2. Item\n3. Item")
-            list_pattern = r'((\d+\.\s*[^\n]+\n){2,})'
-            matches = re.findall(list_pattern, text_to_process)
+            if len(definitions) < definition_limit:
+                for match in DEFINITION_PATTERN.finditer(block):
+                    term, definition = match.group(1).strip(), match.group(2).strip()
+                    if len(term) > 2 and len(definition) > 10:
+                        definitions.append(make_item(
+                            f"Define the term: {term}",
+                            definition,
+                            'definition',
+                            'Terminology'
+                        ))
+                        if len(definitions) >= definition_limit:
+                            break
             
-            # Limit number of lists
-            list_count = 0
-            for match in matches:
-                # Stop after finding enough lists
-                if list_count >= 3:
-                    break
-                    
-                list_text = match[0].strip()
-                if len(list_text) > 30:  # Ensure it's a meaningful list
-                    items.append({
-                        'id': str(uuid.uuid4()),
-                        'prompt': "Type out this list in order:",
-                        'content': list_text,
-                        'type': 'list',
-                        'context': 'Lists'
-                    })
-                    list_count += 1
+            if len(paragraphs) < paragraph_limit:
+                # PyMuPDF text has no blank lines between paragraphs, so long blocks are
+                # split into passages of typeable length at paragraph or sentence breaks
+                for chunk_start, chunk_end in self._iter_chunk_bounds(block, PARAGRAPH_MAX_LENGTH):
+                    paragraph = block[chunk_start:chunk_end].strip()
+                    # Skip very short paragraphs or chapter markers
+                    if len(paragraph) >= 50 and len(paragraph.split()) >= 10:
+                        paragraphs.append(make_item(
+                            "Type this paragraph:",
+                            paragraph,
+                            'paragraph',
+                            'Content'
+                        ))
+                        if len(paragraphs) >= paragraph_limit:
+                            break
             
-            # Match bulleted lists (e.g., "• Item\n• Item\n• Item")
-            if list_count < 3:  # Only if we haven't found enough lists already
-                list_pattern = r'(([•\-\*]\s*[^\n]+\n){2,})'
-                matches = re.findall(list_pattern, text_to_process)
-                
-                for match in matches:
-                    # Stop after finding enough lists
-                    if list_count >= 3:
-                        break
-                        
-                    list_text = match[0].strip()
-                    if len(list_text) > 30:  # Ensure it's a meaningful list
-                        items.append({
-                            'id': str(uuid.uuid4()),
-                            'prompt': "Type out this list in order:",
-                            'content': list_text,
-                            'type': 'list',
-                            'context': 'Lists'
-                        })
-                        list_count += 1
-        except Exception as e:
-            logger.error(f"Error extracting lists: {str(e)}")
+            if len(concepts) < concept_limit and KEY_PHRASE_PATTERN.search(block):
+                for sentence in block.split('.'):
+                    concept = sentence.strip()
+                    if len(concept) > 20 and KEY_PHRASE_PATTERN.search(sentence):
+                        concepts.append(make_item(
+                            "Type this key concept:",
+                            concept,
+                            'key_concept',
+                            'Key Concepts'
+                        ))
+                        if len(concepts) >= concept_limit:
+                            break
+            
+            if len(lists) < list_limit:
+                for match in LIST_PATTERN.finditer(block):
+                    list_text = match.group(0).strip()
+                    if len(list_text) > 30:
+                        lists.append(make_item(
+                            "Type out this list in order:",
+                            list_text,
+                            'list',
+                            'Lists'
+                        ))
+                        if len(lists) >= list_limit:
+                            break
         
-        return items
+        remaining['definition'] -= len(definitions)
+        remaining['paragraph'] -= len(paragraphs)
+        remaining['key_concept'] -= len(concepts)
+        remaining['list'] -= len(lists)
+        return definitions + paragraphs + concepts + lists
     
     @staticmethod
     def get_pdf_support_status():
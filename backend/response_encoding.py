@@ -0,0 +1,152 @@
+"""
+JSON serialization and compression of TypeSpark API responses.
+FastJSONProvider encodes with orjson when it is installed and falls back to the
+standard library otherwise; either way output is compact and keys are not sorted.
+compress_response() gzip or brotli encodes JSON and text responses above a size
+threshold for clients that accept it, and PayloadCache keeps serialized bodies
+of large responses that are requested again unchanged.
+"""
+
+import gzip
+import logging
+import threading
+from collections import OrderedDict
+
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional; it is several times faster than the json module for item lists
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
+# brotli is optional; without it responses are only gzip encoded
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    brotli = None
+    HAS_BROTLI = False
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Smaller responses fit in a packet or two, so encoding them saves nothing
+COMPRESS_MIN_SIZE = 1024
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/html', 'text/csv'}
+
+# Fast settings: responses are compressed on every request, unlike the static build
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available"""
+
+    sort_keys = False
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def _dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        # Skip the str round trip: orjson already produces UTF-8 bytes
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+    def dumps_bytes(self, obj):
+        """Serialize to UTF-8 bytes, e.g. for a response body that is cached and reused"""
+        if orjson is None:
+            return self.dumps(obj).encode('utf-8')
+        return self._dumps_bytes(obj)
+
+
+def negotiate_encoding(request):
+    """The content coding to use for the request: 'br', 'gzip' or None"""
+    if HAS_BROTLI and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response, request):
+    """
+    Encode the response body in place if it is compressible, large enough and the client accepts it.
+    Responses with an ETag (static assets) are left alone: they choose their own encoding and have
+    already been checked against If-None-Match, which a re-encoded body would no longer match.
+    """
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or 'ETag' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    # The body depends on Accept-Encoding even when this one is sent as is
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = negotiate_encoding(request) if len(data) >= COMPRESS_MIN_SIZE else None
+    if encoding is None:
+        return response
+
+    response.set_data(compress(encoding, data))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class PayloadCache:
+    """
+    Serialized response bodies by key, each stored with the version of the data it
+    was built from; a lookup with a different version misses. Least recently used
+    bodies are evicted once the total size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # key -> (version, body), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous[1])
+            self._entries[key] = (version, body)
+            self.total_bytes += len(body)
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
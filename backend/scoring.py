@@ -0,0 +1,274 @@
+"""
+Typing accuracy scoring for TypeSpark.
+Answers are aligned against the expected text by edit distance, so a single
+missed or extra character only costs one error instead of shifting every
+character after it. Close answers (the common case) are aligned with the
+Landau-Vishkin banded algorithm, which also yields the insertion, deletion and
+substitution counts. Its cost grows with the square of the edits, so answers
+that are not close are first measured with Myers' bit-parallel edit distance,
+and only aligned (with exactly that many edits) if the distance is within
+MAX_BANDED_EDITS; beyond that the breakdown is inferred. IncrementalScorer
+keeps the bit-parallel state between keystrokes so live feedback costs
+O(keystrokes) rather than a rescan.
+"""
+
+from collections import Counter
+
+# Above this many edits the banded alignment (O(edits^2)) gives way to the
+# bit-parallel distance (O(len(answer) * len(expected) / word size))
+MAX_BANDED_EDITS = 128
+
+# Edits tried by the banded alignment before measuring the distance; for a few
+# hundred characters this is where the banded search stops being the cheaper one
+QUICK_BANDED_EDITS = 32
+
+# Typed characters between saved alignment states; a backspace replays at most this many
+CHECKPOINT_INTERVAL = 64
+
+# Rows either side of the diagonal searched for the best-matching expected prefix
+PREFIX_WINDOW = 32
+
+# Keystroke that deletes the previous character in a keystroke delta
+BACKSPACE = '\b'
+
+# Longest answer scored, as a multiple of the expected length (plus MAX_BANDED_EDITS);
+# alignment time grows with the answer, so longer answers are rejected unscored
+MAX_ANSWER_RATIO = 2
+
+
+def max_answer_length(expected):
+    """Length of the longest answer that is scored against expected"""
+    return len(expected) * MAX_ANSWER_RATIO + MAX_BANDED_EDITS
+
+
+def edit_lower_bound(expected, answer):
+    """
+    Lower bound on the edit distance from character counts, in linear time.
+    An insertion or deletion changes the counts by one and a substitution by two,
+    so the distance is at least half the count differences plus the length difference.
+    """
+    expected_counts, answer_counts = Counter(expected), Counter(answer)
+    unmatched = sum((expected_counts - answer_counts).values()) + sum((answer_counts - expected_counts).values())
+    return (unmatched + abs(len(expected) - len(answer)) + 1) // 2
+
+
+def _match_length(a, b, i, j):
+    """Length of the common prefix of a[i:] and b[j:], compared in galloping slices"""
+    limit = min(len(a) - i, len(b) - j)
+    if limit <= 0 or a[i] != b[j]:
+        return 0
+    length, step = 1, 1
+    # Double the compared slice while it still matches...
+    while length + step <= limit and a[i + length:i + length + step] == b[j + length:j + length + step]:
+        length += step
+        step *= 2
+    # ...then narrow down on the first mismatch
+    while step > 1:
+        step //= 2
+        if length + step <= limit and a[i + length:i + length + step] == b[j + length:j + length + step]:
+            length += step
+    return length
+
+
+def banded_alignment(expected, answer, max_edits=MAX_BANDED_EDITS):
+    """
+    Align answer against expected with at most max_edits edits (Landau-Vishkin).
+    Returns (insertions, deletions, substitutions), or None if more edits are needed.
+    Insertions are extra characters in answer; deletions are characters of
+    expected that are missing from it.
+    """
+    m, n = len(expected), len(answer)
+    target = n - m
+    if abs(target) > max_edits:
+        return None
+
+    # levels[d][k] = (furthest i on diagonal k = j - i with d edits, edit that got there, source diagonal)
+    levels = []
+    previous = {}
+    for d in range(max_edits + 1):
+        current = {}
+        for k in range(max(-d, -m), min(d, n) + 1):
+            if d == 0:
+                i, edit, source = 0, None, None
+            else:
+                i, edit, source = -1, None, None
+                reach = previous.get(k)
+                if reach is not None and reach[0] < m and reach[0] + k < n:
+                    i, edit, source = reach[0] + 1, 'substitution', k
+                reach = previous.get(k + 1)
+                if reach is not None and reach[0] < m and reach[0] + 1 > i:
+                    i, edit, source = reach[0] + 1, 'deletion', k + 1
+                reach = previous.get(k - 1)
+                if reach is not None and reach[0] + k - 1 < n and reach[0] > i:
+                    i, edit, source = reach[0], 'insertion', k - 1
+                if edit is None:
+                    continue
+            i += _match_length(expected, answer, i, i + k)
+            current[k] = (i, edit, source)
+
+        levels.append(current)
+        if current.get(target, (-1,))[0] >= m:
+            counts = {'insertion': 0, 'deletion': 0, 'substitution': 0}
+            k = target
+            for level in reversed(levels[1:]):
+                _, edit, k = level[k]
+                counts[edit] += 1
+            return counts['insertion'], counts['deletion'], counts['substitution']
+        previous = current
+    return None
+
+
+def _match_vectors(expected):
+    """Bit mask of the positions of each character in expected"""
+    peq = {}
+    for i, char in enumerate(expected):
+        peq[char] = peq.get(char, 0) | (1 << i)
+    return peq
+
+
+def _myers_step(eq, pv, mv, mask):
+    """
+    Advance the vertical delta vectors of the DP column by one answer character.
+    Returns (pv, mv, ph, mh) where ph/mh are the horizontal deltas before shifting.
+    """
+    xv = eq | mv
+    xh = (((eq & pv) + pv) ^ pv) | eq
+    ph = mv | (~(xh | pv) & mask)
+    mh = pv & xh
+    # Shifting in a 1 makes the top row grow with the answer (global alignment)
+    shifted_ph = ((ph << 1) | 1) & mask
+    shifted_mh = (mh << 1) & mask
+    return shifted_mh | (~(xv | shifted_ph) & mask), shifted_ph & xv, ph, mh
+
+
+def bit_parallel_distance(expected, answer):
+    """Levenshtein distance between expected and answer (Myers/Hyyro bit-vector algorithm)"""
+    m = len(expected)
+    if m == 0:
+        return len(answer)
+
+    peq = _match_vectors(expected)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    for char in answer:
+        pv, mv, ph, mh = _myers_step(peq.get(char, 0), pv, mv, mask)
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+    return score
+
+
+class IncrementalScorer:
+    """
+    Live scoring of an answer typed one keystroke at a time. The DP column of
+    the bit-parallel alignment is advanced per character, so each delta costs
+    time proportional to its length; the state is saved every
+    CHECKPOINT_INTERVAL characters so backspaces replay a bounded suffix.
+    Errors are measured against the best-matching prefix of the expected text.
+    """
+
+    def __init__(self, expected):
+        self.expected = expected
+        self._peq = _match_vectors(expected)
+        self._mask = (1 << len(expected)) - 1
+        self._typed = []
+        self._pv, self._mv = self._mask, 0
+        # _checkpoints[c] is (pv, mv) after c * CHECKPOINT_INTERVAL characters
+        self._checkpoints = [(self._pv, self._mv)]
+
+    def __len__(self):
+        return len(self._typed)
+
+    @property
+    def typed(self):
+        """The text typed so far, after backspaces"""
+        return ''.join(self._typed)
+
+    def feed(self, keys):
+        """Apply a keystroke delta; BACKSPACE characters delete the previous character"""
+        for key in keys:
+            if key == BACKSPACE:
+                self._backspace()
+            else:
+                self._type(key)
+
+    def _type(self, char):
+        self._typed.append(char)
+        self._pv, self._mv, _, _ = _myers_step(self._peq.get(char, 0), self._pv, self._mv, self._mask)
+        if len(self._typed) % CHECKPOINT_INTERVAL == 0:
+            self._checkpoints.append((self._pv, self._mv))
+
+    def _backspace(self):
+        if not self._typed:
+            return
+        self._typed.pop()
+        n = len(self._typed)
+        del self._checkpoints[n // CHECKPOINT_INTERVAL + 1:]
+        pv, mv = self._checkpoints[-1]
+        for char in self._typed[n - n % CHECKPOINT_INTERVAL:]:
+            pv, mv, _, _ = _myers_step(self._peq.get(char, 0), pv, mv, self._mask)
+        self._pv, self._mv = pv, mv
+
+    def errors(self):
+        """Edit distance between the typed text and the closest prefix of the expected text"""
+        n, m = len(self._typed), len(self.expected)
+        # Rows far from the diagonal cost at least their distance from it, so a
+        # window around it is enough unless the typed text is badly off
+        best = self._min_row(max(0, n - PREFIX_WINDOW), min(m, n + PREFIX_WINDOW))
+        if best > PREFIX_WINDOW:
+            best = self._min_row(0, m)
+        return best
+
+    def _min_row(self, first, last):
+        """Minimum of the current DP column over rows first..last"""
+        n = len(self._typed)
+        low = (1 << first) - 1
+        value = n + bin(self._pv & low).count('1') - bin(self._mv & low).count('1')
+        best = value
+        width = last - first
+        pv, mv = self._pv >> first, self._mv >> first
+        for _ in range(width):
+            value += (pv & 1) - (mv & 1)
+            pv >>= 1
+            mv >>= 1
+            if value < best:
+                best = value
+        return best
+
+
+def score_answer(expected, answer):
+    """
+    Score a typed answer against the expected text. Returns a dict with the edit
+    distance, its breakdown into insertions, deletions and substitutions, the
+    number of matched characters and accuracy (matches over alignment length).
+    When the answer needs more than MAX_BANDED_EDITS edits the breakdown is
+    inferred from the distance and the length difference.
+    """
+    m, n = len(expected), len(answer)
+    counts = None
+    # Close answers are aligned directly, unless the length difference and
+    # character counts already show they need more edits than the quick band
+    if edit_lower_bound(expected, answer) <= QUICK_BANDED_EDITS:
+        counts = banded_alignment(expected, answer, QUICK_BANDED_EDITS)
+    if counts is None:
+        distance = bit_parallel_distance(expected, answer)
+        if distance <= MAX_BANDED_EDITS:
+            # The banded search now stops at the level where it succeeds
+            counts = banded_alignment(expected, answer, distance)
+        else:
+            insertions, deletions = max(n - m, 0), max(m - n, 0)
+            counts = (insertions, deletions, distance - insertions - deletions)
+    insertions, deletions, substitutions = counts
+
+    matches = m - deletions - substitutions
+    alignment_length = m + insertions
+    return {
+        'distance': insertions + deletions + substitutions,
+        'insertions': insertions,
+        'deletions': deletions,
+        'substitutions': substitutions,
+        'matches': matches,
+        'accuracy': matches / alignment_length if alignment_length else 1.0
+    }
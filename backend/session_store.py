@@ -0,0 +1,1173 @@
+"""
+Session storage backends for TypeSpark.
+Sessions hold the study items of an upload plus a cursor (current_index). The
+SQLite and memory-mapped backends are shared between processes, so a session
+created by one server worker can be served by any other and survives restarts.
+Every backend advances the cursor atomically, expires idle sessions after a TTL
+and evicts the least recently used sessions once their items exceed a byte budget.
+Item records are stored once and shared by every session that contains them.
+"""
+
+import os
+import json
+import mmap
+import time
+import uuid
+import struct
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from study_items import ItemPool, StudyItem
+
+# fcntl is only available on POSIX systems; the mmap backend requires it
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sessions expire after this many seconds without being accessed (6 hours)
+DEFAULT_TTL = 6 * 60 * 60
+
+# Minimum number of seconds between sweeps for expired sessions
+PURGE_INTERVAL = 60
+
+# Default budget for the serialized size of all session items (256MB)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Default number of slots in the mmap backend's session table
+DEFAULT_CAPACITY = 65536
+
+
+def item_size(item):
+    """Serialized size of an item in bytes, used for the session byte budget"""
+    return len(json.dumps(item))
+
+
+class SessionStore:
+    """
+    Interface shared by all session backends. A session is a dict with
+    'items', 'current_index', 'total_items', 'filename' and 'streaming'.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._last_purge = 0
+        # Sessions removed by this process, by reason
+        self.evictions = {'expired': 0, 'lru': 0}
+
+    def create(self, session_id, items, filename, streaming=False):
+        """Store a new session with its items and the cursor at the first item"""
+        raise NotImplementedError
+
+    def get(self, session_id):
+        """Return the full session dict, or None if it does not exist or has expired"""
+        raise NotImplementedError
+
+    def peek(self, session_id):
+        """Return the session state without items ({'current_index', 'total_items', 'streaming'}) or None"""
+        raise NotImplementedError
+
+    def advance(self, session_id):
+        """
+        Atomically return the item at the cursor and move the cursor past it.
+        Returns (item, state) where item is None once the cursor has reached the
+        end, or None if the session does not exist.
+        """
+        advanced = self.advance_many(session_id, 1)
+        if advanced is None:
+            return None
+        items, state = advanced
+        return (items[0] if items else None), state
+
+    def advance_many(self, session_id, count, expected_index=None):
+        """
+        Atomically return up to count items from the cursor and move the cursor past them.
+        Returns (items, state), or None if the session does not exist.
+        With expected_index the cursor only moves if it is still there (compare-and-swap);
+        if it has already moved on, the items from expected_index are returned again
+        without moving it, so a retried request gets the same items. No items are
+        returned for an expected_index past the cursor.
+        """
+        raise NotImplementedError
+
+    def items_at(self, session_id, start, count):
+        """Return up to count items from position start without moving the cursor, or None"""
+        raise NotImplementedError
+
+    def find_item(self, session_id, item_id):
+        """Return the item with the given id from the session, or None"""
+        raise NotImplementedError
+
+    def append_items(self, session_id, items):
+        """Append items to a (streaming) session; returns False if the session is gone"""
+        raise NotImplementedError
+
+    def finish_streaming(self, session_id):
+        """Mark a streaming session as complete"""
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        """Remove a session"""
+        raise NotImplementedError
+
+    def save_answer(self, session_id, item_id, typed, started):
+        """Store the answer being typed for an item, so live scoring can resume in any process"""
+        raise NotImplementedError
+
+    def load_answer(self, session_id, item_id):
+        """Return the stored answer being typed for an item as (typed, started), or None"""
+        raise NotImplementedError
+
+    def clear_answer(self, session_id, item_id):
+        """Forget the answer being typed for an item, e.g. once it is submitted"""
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Remove all expired sessions and return how many were removed"""
+        raise NotImplementedError
+
+    def total_bytes(self):
+        """Return the serialized size of all stored items"""
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __contains__(self, session_id):
+        return self.peek(session_id) is not None
+
+    def stats(self):
+        """Return store statistics for diagnostics"""
+        return {
+            'backend': self.backend,
+            'sessions': len(self),
+            'ttl_seconds': self.ttl,
+            'total_bytes': self.total_bytes(),
+            'max_bytes': self.max_bytes,
+            'evictions': dict(self.evictions)
+        }
+
+    def _maybe_purge(self):
+        """Sweep expired sessions at most once per PURGE_INTERVAL"""
+        now = time.time()
+        if now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        try:
+            removed = self.purge_expired()
+            if removed:
+                self.evictions['expired'] += removed
+                logger.info(f"Expired {removed} idle sessions")
+        except Exception as e:
+            logger.error(f"Error purging expired sessions: {str(e)}")
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store; fast, but sessions are private to one worker and lost on restart"""
+
+    backend = 'memory'
+
+    def __init__(self, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(ttl, max_bytes)
+        # Ordered from least to most recently used
+        self._sessions = OrderedDict()
+        # Items are interned once and sessions hold compact arrays of handles
+        self._pool = ItemPool()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _live(self, session_id):
+        """Return the session if present and not expired, refreshing its TTL. Caller holds the lock."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        now = time.time()
+        if session['expires_at'] < now:
+            self._remove(session_id)
+            self.evictions['expired'] += 1
+            return None
+        session['expires_at'] = now + self.ttl
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _remove(self, session_id):
+        """Drop a session, its item references and its byte accounting. Caller holds the lock."""
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._pool.release(session['handles'])
+            self._bytes -= session['size_bytes']
+
+    def _evict(self, keep):
+        """Evict least recently used sessions (other than keep) until within budget. Caller holds the lock."""
+        while self._bytes + self._pool.total_bytes > self.max_bytes and len(self._sessions) > 1:
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                self._sessions.move_to_end(session_id)
+                session_id = next(iter(self._sessions))
+            self._remove(session_id)
+            self.evictions['lru'] += 1
+
+    @staticmethod
+    def _state(session):
+        return {
+            'current_index': session['current_index'],
+            'total_items': session['total_items'],
+            'streaming': session['streaming']
+        }
+
+    def _index_handles(self, index, handles, first_position):
+        """Map each item id (as an int) to its first position in the session"""
+        for position, handle in enumerate(handles, first_position):
+            index.setdefault(self._pool.get(handle).id, position)
+        return index
+
+    def create(self, session_id, items, filename, streaming=False):
+        self._maybe_purge()
+        with self._lock:
+            self._remove(session_id)
+            handles = self._pool.intern(items)
+            size = handles.itemsize * len(handles)
+            self._sessions[session_id] = {
+                'handles': handles,
+                'index': self._index_handles({}, handles, 0),
+                'current_index': 0,
+                'total_items': len(handles),
+                'filename': filename,
+                'streaming': streaming,
+                'expires_at': time.time() + self.ttl,
+                'size_bytes': size,
+                # item id -> (typed, started) of answers being typed
+                'answers': {}
+            }
+            self._bytes += size
+            self._evict(session_id)
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._live(session_id)
+            if session is None:
+                return None
+            result = dict(session, items=[self._pool.get(handle).to_dict() for handle in session['handles']])
+            del result['handles']
+            del result['index']
+            del result['expires_at']
+            del result['size_bytes']
+            del result['answers']
+            return result
+
+    def peek(self, session_id):
+        with self._lock:
+            session = self._live(session_id)
+            return self._state(session) if session is not None else None
+
+    def _items(self, session, start, count):
+        """Items at positions start..start+count of a session. Caller holds the lock."""
+        return [self._pool.get(handle).to_dict() for handle in session['handles'][start:start + count]]
+
+    def advance_many(self, session_id, count, expected_index=None):
+        with self._lock:
+            session = self._live(session_id)
+            if session is None:
+                return None
+            start = session['current_index'] if expected_index is None else expected_index
+            items = self._items(session, start, count) if start <= session['current_index'] else []
+            if start == session['current_index']:
+                session['current_index'] += len(items)
+            return items, self._state(session)
+
+    def items_at(self, session_id, start, count):
+        with self._lock:
+            session = self._live(session_id)
+            return self._items(session, start, count) if session is not None else None
+
+    def find_item(self, session_id, item_id):
+        try:
+            key = uuid.UUID(item_id).int
+        except (ValueError, TypeError, AttributeError):
+            return None
+        with self._lock:
+            session = self._live(session_id)
+            if session is None:
+                return None
+            position = session['index'].get(key)
+            if position is None:
+                return None
+            return self._pool.get(session['handles'][position]).to_dict()
+
+    def append_items(self, session_id, items):
+        with self._lock:
+            session = self._live(session_id)
+            if session is None:
+                return False
+            handles = self._pool.intern(items)
+            size = handles.itemsize * len(handles)
+            self._index_handles(session['index'], handles, len(session['handles']))
+            session['handles'].extend(handles)
+            session['total_items'] = len(session['handles'])
+            session['size_bytes'] += size
+            self._bytes += size
+            self._evict(session_id)
+            return True
+
+    def finish_streaming(self, session_id):
+        with self._lock:
+            session = self._live(session_id)
+            if session is not None:
+                session['streaming'] = False
+
+    def delete(self, session_id):
+        with self._lock:
+            self._remove(session_id)
+
+    def save_answer(self, session_id, item_id, typed, started):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session['answers'][item_id] = (typed, started)
+
+    def load_answer(self, session_id, item_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session['answers'].get(item_id) if session is not None else None
+
+    def clear_answer(self, session_id, item_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session['answers'].pop(item_id, None)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, session in self._sessions.items() if session['expires_at'] < now]
+            for session_id in expired:
+                self._remove(session_id)
+        return len(expired)
+
+    def total_bytes(self):
+        with self._lock:
+            return self._bytes + self._pool.total_bytes
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Embedded SQLite store in WAL mode, shared by every worker process on the host.
+    Item records live once in a reference-counted table; a session's items are
+    rows of (position, item id), indexed by id so items are found without
+    scanning the session. The byte total is kept in a counter row.
+    """
+
+    backend = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            filename TEXT,
+            current_index INTEGER NOT NULL DEFAULT 0,
+            total_items INTEGER NOT NULL DEFAULT 0,
+            streaming INTEGER NOT NULL DEFAULT 0,
+            expires_at REAL NOT NULL,
+            size_bytes INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at);
+        CREATE TABLE IF NOT EXISTS item_records (
+            id BLOB PRIMARY KEY,
+            payload TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            refs INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS session_entries (
+            session_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            item_id BLOB NOT NULL,
+            PRIMARY KEY (session_id, position)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS session_entries_item ON session_entries (session_id, item_id);
+        CREATE TABLE IF NOT EXISTS store_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            total_bytes INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS answers (
+            session_id TEXT NOT NULL,
+            item_id TEXT NOT NULL,
+            typed TEXT NOT NULL,
+            started REAL NOT NULL,
+            PRIMARY KEY (session_id, item_id)
+        ) WITHOUT ROWID;
+    """
+
+    # Bytes charged to a session per item it references
+    ID_SIZE = 16
+
+    # Item ids per existence query (SQLite limits bound parameters)
+    LOOKUP_BATCH = 500
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(ttl, max_bytes)
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        with self._transaction() as conn:
+            # Recount on startup so the running total cannot drift
+            conn.execute(
+                'INSERT OR REPLACE INTO store_totals (id, total_bytes) VALUES (0, '
+                '(SELECT COALESCE(SUM(size_bytes), 0) FROM sessions) + '
+                '(SELECT COALESCE(SUM(size_bytes), 0) FROM item_records))'
+            )
+
+    def _conn(self):
+        """Return this thread's connection, reconnecting after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in a write transaction so read-modify-write sequences are atomic across processes"""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _touch(self, conn, session_id):
+        """Return (current_index, total_items, streaming) for a live session and refresh its TTL"""
+        now = time.time()
+        row = conn.execute(
+            'SELECT current_index, total_items, streaming FROM sessions WHERE id = ? AND expires_at >= ?',
+            (session_id, now)
+        ).fetchone()
+        if row is not None:
+            conn.execute('UPDATE sessions SET expires_at = ? WHERE id = ?', (now + self.ttl, session_id))
+        return row
+
+    @staticmethod
+    def _state(row):
+        return {'current_index': row[0], 'total_items': row[1], 'streaming': bool(row[2])}
+
+    @staticmethod
+    def _add_bytes(conn, delta):
+        conn.execute('UPDATE store_totals SET total_bytes = total_bytes + ? WHERE id = 0', (delta,))
+
+    def _add_entries(self, conn, session_id, items, first_position):
+        """
+        Reference items from a session at consecutive positions, storing records
+        that are new. Returns the bytes added, which are also added to the total.
+        """
+        records = {}
+        keys = []
+        for item in items:
+            key = uuid.UUID(item['id']).bytes
+            if key not in records:
+                records[key] = item
+            keys.append((key,))
+        # Look up which records are already stored, a bounded number of ids per query
+        unique = list(records)
+        for start in range(0, len(unique), self.LOOKUP_BATCH):
+            batch = unique[start:start + self.LOOKUP_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            for (key,) in conn.execute(f'SELECT id FROM item_records WHERE id IN ({placeholders})', batch):
+                del records[key]
+        rows = [(key, json.dumps(item)) for key, item in records.items()]
+        conn.executemany('INSERT INTO item_records (id, payload, size_bytes) VALUES (?, ?, ?)',
+                         [(key, payload, len(payload)) for key, payload in rows])
+        added = sum(len(payload) for _, payload in rows)
+        conn.executemany('UPDATE item_records SET refs = refs + 1 WHERE id = ?', keys)
+        conn.executemany('INSERT INTO session_entries (session_id, position, item_id) VALUES (?, ?, ?)',
+                         [(session_id, position, key) for position, (key,) in enumerate(keys, first_position)])
+        added += len(keys) * self.ID_SIZE
+        self._add_bytes(conn, added)
+        return added
+
+    def _drop(self, conn, session_id):
+        """Delete a session and release its items. Returns the bytes freed."""
+        row = conn.execute('SELECT size_bytes FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        if row is None:
+            return 0
+        keys = conn.execute('SELECT item_id FROM session_entries WHERE session_id = ?', (session_id,)).fetchall()
+        conn.execute('DELETE FROM session_entries WHERE session_id = ?', (session_id,))
+        conn.execute('DELETE FROM answers WHERE session_id = ?', (session_id,))
+        conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+        conn.executemany('UPDATE item_records SET refs = refs - 1 WHERE id = ?', keys)
+        freed = row[0]
+        for key in set(keys):
+            record = conn.execute('SELECT size_bytes FROM item_records WHERE id = ? AND refs <= 0', key).fetchone()
+            if record is not None:
+                conn.execute('DELETE FROM item_records WHERE id = ?', key)
+                freed += record[0]
+        self._add_bytes(conn, -freed)
+        return freed
+
+    @staticmethod
+    def _total_bytes(conn):
+        return conn.execute('SELECT total_bytes FROM store_totals WHERE id = 0').fetchone()[0]
+
+    def _evict(self, conn, keep):
+        """Evict least recently used sessions (other than keep) until within budget"""
+        total = self._total_bytes(conn)
+        if total <= self.max_bytes:
+            return
+        # expires_at is last access + TTL, so it orders sessions by recency
+        victims = [row[0] for row in conn.execute(
+            'SELECT id FROM sessions WHERE id != ? ORDER BY expires_at', (keep,))]
+        for session_id in victims:
+            if total <= self.max_bytes:
+                break
+            total -= self._drop(conn, session_id)
+            self.evictions['lru'] += 1
+
+    def create(self, session_id, items, filename, streaming=False):
+        self._maybe_purge()
+        with self._transaction() as conn:
+            self._drop(conn, session_id)
+            conn.execute(
+                'INSERT INTO sessions (id, filename, current_index, total_items, streaming, expires_at, size_bytes) '
+                'VALUES (?, ?, 0, ?, ?, ?, ?)',
+                (session_id, filename, len(items), int(streaming), time.time() + self.ttl,
+                 len(items) * self.ID_SIZE)
+            )
+            self._add_entries(conn, session_id, items, 0)
+            self._evict(conn, session_id)
+
+    def get(self, session_id):
+        with self._transaction() as conn:
+            row = self._touch(conn, session_id)
+            if row is None:
+                return None
+            filename = conn.execute('SELECT filename FROM sessions WHERE id = ?', (session_id,)).fetchone()[0]
+            payloads = conn.execute(
+                'SELECT payload FROM session_entries JOIN item_records ON item_records.id = session_entries.item_id '
+                'WHERE session_entries.session_id = ? ORDER BY session_entries.position', (session_id,)
+            ).fetchall()
+        session = self._state(row)
+        session['items'] = [json.loads(payload) for (payload,) in payloads]
+        session['filename'] = filename
+        return session
+
+    def peek(self, session_id):
+        row = self._conn().execute(
+            'SELECT current_index, total_items, streaming FROM sessions WHERE id = ? AND expires_at >= ?',
+            (session_id, time.time())
+        ).fetchone()
+        return self._state(row) if row is not None else None
+
+    @staticmethod
+    def _items(conn, session_id, start, end):
+        """Items at positions start..end of a session, in order"""
+        rows = conn.execute(
+            'SELECT payload FROM session_entries JOIN item_records ON item_records.id = session_entries.item_id '
+            'WHERE session_entries.session_id = ? AND session_entries.position >= ? AND session_entries.position < ? '
+            'ORDER BY session_entries.position', (session_id, start, end)
+        ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def advance_many(self, session_id, count, expected_index=None):
+        with self._transaction() as conn:
+            row = self._touch(conn, session_id)
+            if row is None:
+                return None
+            current_index, total_items, streaming = row
+            start = current_index if expected_index is None else expected_index
+            items = []
+            if start <= current_index and start < total_items:
+                items = self._items(conn, session_id, start, min(start + count, total_items))
+            if start == current_index and items:
+                current_index += len(items)
+                conn.execute('UPDATE sessions SET current_index = ? WHERE id = ?', (current_index, session_id))
+        return items, self._state((current_index, total_items, streaming))
+
+    def items_at(self, session_id, start, count):
+        state = self.peek(session_id)
+        if state is None:
+            return None
+        return self._items(self._conn(), session_id, start, min(start + count, state['total_items']))
+
+    def find_item(self, session_id, item_id):
+        try:
+            key = uuid.UUID(item_id).bytes
+        except (ValueError, TypeError, AttributeError):
+            return None
+        row = self._conn().execute(
+            'SELECT payload FROM session_entries JOIN item_records ON item_records.id = session_entries.item_id '
+            'WHERE session_entries.session_id = ? AND session_entries.item_id = ? LIMIT 1', (session_id, key)
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def append_items(self, session_id, items):
+        with self._transaction() as conn:
+            row = self._touch(conn, session_id)
+            if row is None:
+                return False
+            self._add_entries(conn, session_id, items, row[1])
+            conn.execute('UPDATE sessions SET total_items = ?, size_bytes = size_bytes + ? WHERE id = ?',
+                         (row[1] + len(items), len(items) * self.ID_SIZE, session_id))
+            self._evict(conn, session_id)
+        return True
+
+    def finish_streaming(self, session_id):
+        self._conn().execute('UPDATE sessions SET streaming = 0 WHERE id = ?', (session_id,))
+
+    def delete(self, session_id):
+        with self._transaction() as conn:
+            self._drop(conn, session_id)
+
+    def save_answer(self, session_id, item_id, typed, started):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO answers (session_id, item_id, typed, started) '
+            'SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM sessions WHERE id = ?)',
+            (session_id, item_id, typed, started, session_id)
+        )
+
+    def load_answer(self, session_id, item_id):
+        row = self._conn().execute('SELECT typed, started FROM answers WHERE session_id = ? AND item_id = ?',
+                                   (session_id, item_id)).fetchone()
+        return tuple(row) if row is not None else None
+
+    def clear_answer(self, session_id, item_id):
+        self._conn().execute('DELETE FROM answers WHERE session_id = ? AND item_id = ?', (session_id, item_id))
+
+    def purge_expired(self):
+        with self._transaction() as conn:
+            expired = [row[0] for row in conn.execute('SELECT id FROM sessions WHERE expires_at < ?',
+                                                      (time.time(),))]
+            for session_id in expired:
+                self._drop(conn, session_id)
+        return len(expired)
+
+    def total_bytes(self):
+        return self._total_bytes(self._conn())
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+
+class MmapSessionStore(SessionStore):
+    """
+    Store whose cursor table lives in a memory-mapped file shared by all worker processes.
+    Each session occupies a fixed-size slot (found by open addressing on the session UUID)
+    holding its cursor, item count and expiry; updates happen under an fcntl lock.
+    Each session has an append-only file listing its item ids after a header line with
+    the session metadata; item records are written once per item id and shared, and
+    records no session refers to are collected when sessions are purged or evicted.
+    The byte budget counts every session's items in full, shared or not.
+    """
+
+    backend = 'mmap'
+
+    HEADER_FORMAT = '<8sqqqq'  # magic, capacity, live sessions, total item bytes, tombstones
+    SLOT_FORMAT = '<16sqqdqB7x'  # session uuid, current_index, total_items, expires_at, size_bytes, flags
+    MAGIC = b'TSSESS01'
+
+    # Record fields, as unpacked from SLOT_FORMAT
+    CURRENT_INDEX, TOTAL_ITEMS, EXPIRES_AT, SIZE_BYTES, FLAGS = 1, 2, 3, 4, 5
+
+    # Evict down to this fraction of the byte budget (or session limit), so the slot scan runs rarely
+    EVICTION_TARGET = 0.9
+
+    # Most sessions held at once, as a fraction of the slots; beyond it the least
+    # recently used sessions are evicted, however few bytes they use
+    MAX_LOAD_FACTOR = 0.9
+
+    # Rehash the table once this fraction of its slots are tombstones, which would
+    # otherwise lengthen every probe chain until lookups scan most of the table
+    TOMBSTONE_LIMIT = 0.2
+
+    # Slot flags
+    USED = 1
+    STREAMING = 2
+    DELETED = 4
+
+    # Parsed session id lists and indexes kept per process, keyed by session id
+    PAYLOAD_CACHE_SIZE = 256
+
+    # Item records kept per process as StudyItems, keyed by item id
+    RECORD_CACHE_SIZE = 4096
+
+    # Item records younger than this are never collected, so a session being created
+    # concurrently cannot lose records it wrote before its id list
+    RECORD_GRACE_SECONDS = 60
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, capacity=DEFAULT_CAPACITY):
+        if fcntl is None:
+            raise RuntimeError("The mmap session store requires fcntl (POSIX only)")
+        super().__init__(ttl, max_bytes)
+        self.path = path
+        self.items_dir = f"{path}.items"
+        self.records_dir = os.path.join(self.items_dir, 'records')
+        self.header_size = struct.calcsize(self.HEADER_FORMAT)
+        self.slot_size = struct.calcsize(self.SLOT_FORMAT)
+        self._lock = threading.Lock()
+        self._payloads = OrderedDict()
+        self._records = OrderedDict()
+        os.makedirs(self.records_dir, exist_ok=True)
+
+        size = self.header_size + capacity * self.slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._pid = os.getpid()
+        with self._locked():
+            if not os.pread(self._fd, len(self.MAGIC), 0):
+                # New file: an empty table
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, struct.pack(self.HEADER_FORMAT, self.MAGIC, capacity, 0, 0, 0), 0)
+        self._map = mmap.mmap(self._fd, 0)
+        magic, self.capacity, _, _, _ = struct.unpack_from(self.HEADER_FORMAT, self._map, 0)
+        if magic != self.MAGIC:
+            raise RuntimeError(f"{path} is not a TypeSpark session table")
+        if self.capacity != capacity:
+            logger.warning(f"Session table {path} has {self.capacity} slots, not {capacity}; "
+                           f"remove it to use the new capacity")
+        self.max_sessions = max(1, int(self.capacity * self.MAX_LOAD_FACTOR))
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive access across threads (threading lock) and processes (fcntl lock)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # flock locks belong to the open file, which a forked worker (e.g. with
+                # a preloaded app) shares with its parent, so each process opens its own
+                self._fd = os.open(self.path, os.O_RDWR)
+                self._pid = os.getpid()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _read_slot(self, slot):
+        return struct.unpack_from(self.SLOT_FORMAT, self._map, self.header_size + slot * self.slot_size)
+
+    def _write_slot(self, slot, key, current_index, total_items, expires_at, size_bytes, flags):
+        struct.pack_into(self.SLOT_FORMAT, self._map, self.header_size + slot * self.slot_size,
+                         key, current_index, total_items, expires_at, size_bytes, flags)
+
+    def _adjust_totals(self, sessions_delta, bytes_delta, tombstones_delta=0):
+        magic, capacity, live, total_bytes, tombstones = struct.unpack_from(self.HEADER_FORMAT, self._map, 0)
+        struct.pack_into(self.HEADER_FORMAT, self._map, 0, magic, capacity,
+                         live + sessions_delta, total_bytes + bytes_delta, tombstones + tombstones_delta)
+
+    def _rehash(self):
+        """
+        Rebuild the table in place without tombstones once there are too many of them.
+        Live slots are read out, the table is cleared and they are inserted again,
+        so probe chains end at the first never-used slot again. Caller holds the lock.
+        """
+        tombstones = struct.unpack_from(self.HEADER_FORMAT, self._map, 0)[4]
+        if tombstones <= self.capacity * self.TOMBSTONE_LIMIT:
+            return
+        records = [record for record in map(self._read_slot, range(self.capacity)) if record[self.FLAGS] & self.USED]
+        self._map[self.header_size:self.header_size + self.capacity * self.slot_size] = \
+            bytes(self.capacity * self.slot_size)
+        for record in records:
+            self._write_slot(self._free_slot(record[0]), *record)
+        self._adjust_totals(0, 0, -tombstones)
+        logger.info(f"Rehashed session table: {len(records)} sessions, {tombstones} tombstones cleared")
+
+    def _free_slot(self, key):
+        """Return the first slot on key's probe chain that holds no session, or None. Caller holds the lock."""
+        start = int.from_bytes(key[:8], 'little') % self.capacity
+        for probe in range(self.capacity):
+            slot = (start + probe) % self.capacity
+            if not self._read_slot(slot)[self.FLAGS] & self.USED:
+                return slot
+        return None
+
+    def _evict(self, keep_slot=None, reserve=0):
+        """
+        Evict least recently used sessions (other than keep_slot) until within the byte
+        budget and with room for reserve more sessions under max_sessions. Caller holds the lock.
+        """
+        live, total_bytes = struct.unpack_from(self.HEADER_FORMAT, self._map, 0)[2:4]
+        if total_bytes <= self.max_bytes and live + reserve <= self.max_sessions:
+            return
+        # expires_at is last access + TTL, so it orders sessions by recency
+        candidates = []
+        for slot in range(self.capacity):
+            record = self._read_slot(slot)
+            if record[self.FLAGS] & self.USED and slot != keep_slot:
+                candidates.append((record[self.EXPIRES_AT], slot, record))
+        byte_target = self.max_bytes * self.EVICTION_TARGET
+        session_target = max(int(self.max_sessions * self.EVICTION_TARGET), 1) - reserve
+        for _, slot, record in sorted(candidates):
+            if total_bytes <= byte_target and live <= session_target:
+                break
+            total_bytes -= record[self.SIZE_BYTES]
+            live -= 1
+            self._free(slot, str(uuid.UUID(bytes=record[0])))
+            self.evictions['lru'] += 1
+        self._collect_records()
+
+    @staticmethod
+    def _key(session_id):
+        try:
+            return uuid.UUID(session_id).bytes
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def _find(self, key):
+        """Return the slot holding key, or None. Caller holds the lock."""
+        start = int.from_bytes(key[:8], 'little') % self.capacity
+        for probe in range(self.capacity):
+            slot = (start + probe) % self.capacity
+            record = self._read_slot(slot)
+            slot_key, flags = record[0], record[self.FLAGS]
+            if flags == 0:
+                return None
+            if flags & self.USED and slot_key == key:
+                return slot
+        return None
+
+    def _find_live(self, session_id):
+        """Return (slot, record) for a live session and refresh its TTL, or None. Caller holds the lock."""
+        key = self._key(session_id)
+        if key is None:
+            return None
+        slot = self._find(key)
+        if slot is None:
+            return None
+        record = list(self._read_slot(slot))
+        now = time.time()
+        if record[self.EXPIRES_AT] < now:
+            self._free(slot, session_id)
+            self.evictions['expired'] += 1
+            return None
+        record[self.EXPIRES_AT] = now + self.ttl
+        self._write_slot(slot, *record)
+        return slot, record
+
+    def _free(self, slot, session_id):
+        """Release a slot, leaving a tombstone so probe chains stay intact. Caller holds the lock."""
+        size_bytes = self._read_slot(slot)[self.SIZE_BYTES]
+        self._write_slot(slot, b'\0' * 16, 0, 0, 0.0, 0, self.DELETED)
+        self._adjust_totals(-1, -size_bytes, 1)
+        self._payloads.pop(session_id, None)
+        for path in (self._items_path(session_id), self._answers_path(session_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _items_path(self, session_id):
+        return os.path.join(self.items_dir, f"{session_id}.ids")
+
+    def _answers_path(self, session_id):
+        return os.path.join(self.items_dir, f"{session_id}.answers")
+
+    def _read_answers(self, session_id):
+        """Return {item_id: [typed, started]} of the answers being typed in a session"""
+        try:
+            with open(self._answers_path(session_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_answers(self, session_id, answers):
+        path = self._answers_path(session_id)
+        if not answers:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(answers, f)
+        os.replace(temp_path, path)
+
+    def _record_path(self, item_id):
+        return os.path.join(self.records_dir, f"{item_id}.json")
+
+    def _write_records(self, items):
+        """Write each item's shared record if missing and return (id lines, logical bytes)"""
+        lines = []
+        size = 0
+        for item in items:
+            item_id = str(uuid.UUID(item['id']))
+            payload = json.dumps(item)
+            size += len(payload)
+            lines.append(item_id + '\n')
+            record_path = self._record_path(item_id)
+            try:
+                # Refresh the timestamp so the collector leaves a record we are about to reference
+                os.utime(record_path, None)
+                continue
+            except OSError:
+                pass
+            temp_path = f"{record_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(temp_path, record_path)
+        return lines, size
+
+    def _record(self, item_id):
+        """Return the item dict for an id, through the per-process record cache"""
+        record = self._records.get(item_id)
+        if record is None:
+            with open(self._record_path(item_id), 'r', encoding='utf-8') as f:
+                record = StudyItem.from_dict(json.load(f))
+            self._records[item_id] = record
+            while len(self._records) > self.RECORD_CACHE_SIZE:
+                self._records.popitem(last=False)
+        else:
+            self._records.move_to_end(item_id)
+        return record.to_dict()
+
+    def _load(self, session_id, total_items):
+        """
+        Return the cached {'meta', 'ids', 'index', 'offset'} for a session, where
+        index maps each item id to its first position. Only lines appended since
+        the last read are parsed when the session has grown.
+        """
+        cached = self._payloads.get(session_id)
+        if cached is None or len(cached['ids']) < total_items:
+            with open(self._items_path(session_id), 'rb') as f:
+                if cached is None:
+                    meta = json.loads(f.readline())
+                    cached = {'meta': meta, 'ids': [], 'index': {}, 'offset': f.tell()}
+                f.seek(cached['offset'])
+                data = f.read()
+            # Ignore a partially written last line
+            data = data[:data.rfind(b'\n') + 1]
+            cached['offset'] += len(data)
+            ids, index = cached['ids'], cached['index']
+            for item_id in data.decode('utf-8').splitlines():
+                index.setdefault(item_id, len(ids))
+                ids.append(item_id)
+            self._payloads[session_id] = cached
+            while len(self._payloads) > self.PAYLOAD_CACHE_SIZE:
+                self._payloads.popitem(last=False)
+        else:
+            self._payloads.move_to_end(session_id)
+        return cached
+
+    def _collect_records(self):
+        """Delete item records that no session file refers to. Caller holds the lock."""
+        referenced = set()
+        for filename in os.listdir(self.items_dir):
+            if not filename.endswith('.ids'):
+                continue
+            try:
+                with open(os.path.join(self.items_dir, filename), 'r', encoding='utf-8') as f:
+                    f.readline()
+                    referenced.update(line.rstrip('\n') for line in f)
+            except OSError:
+                continue
+
+        cutoff = time.time() - self.RECORD_GRACE_SECONDS
+        removed = 0
+        for filename in os.listdir(self.records_dir):
+            item_id = filename[:-len('.json')]
+            if not filename.endswith('.json') or item_id in referenced:
+                continue
+            record_path = os.path.join(self.records_dir, filename)
+            try:
+                if os.stat(record_path).st_mtime < cutoff:
+                    os.remove(record_path)
+                    self._records.pop(item_id, None)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def _state(self, record):
+        return {
+            'current_index': record[self.CURRENT_INDEX],
+            'total_items': record[self.TOTAL_ITEMS],
+            'streaming': bool(record[self.FLAGS] & self.STREAMING)
+        }
+
+    def create(self, session_id, items, filename, streaming=False):
+        key = self._key(session_id)
+        if key is None:
+            raise ValueError(f"Session ids must be UUIDs: {session_id}")
+        self._maybe_purge()
+
+        lines, size = self._write_records(items)
+        with open(self._items_path(session_id), 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'filename': filename}) + '\n')
+            f.writelines(lines)
+
+        flags = self.USED | (self.STREAMING if streaming else 0)
+        with self._locked():
+            # Make room in the table first; eviction leaves tombstones the rehash may clear
+            self._evict(reserve=1)
+            self._rehash()
+            # Session ids are new UUIDs, so the first tombstone on the chain can be reused
+            slot = self._free_slot(key)
+            if slot is None:
+                raise RuntimeError("Session table is full")
+            reused = self._read_slot(slot)[self.FLAGS] & self.DELETED
+            self._write_slot(slot, key, 0, len(items), time.time() + self.ttl, size, flags)
+            self._adjust_totals(1, size, -1 if reused else 0)
+            self._evict(slot)
+
+    def get(self, session_id):
+        with self._locked():
+            found = self._find_live(session_id)
+            if found is None:
+                return None
+            record = found[1]
+            cached = self._load(session_id, record[self.TOTAL_ITEMS])
+            items = [self._record(item_id) for item_id in cached['ids'][:record[self.TOTAL_ITEMS]]]
+        session = self._state(record)
+        session['items'] = items
+        session['filename'] = cached['meta']['filename']
+        return session
+
+    def peek(self, session_id):
+        with self._locked():
+            found = self._find_live(session_id)
+            return self._state(found[1]) if found is not None else None
+
+    def _items(self, session_id, record, start, count):
+        """Items at positions start..start+count of a session. Caller holds the lock."""
+        end = min(start + count, record[self.TOTAL_ITEMS])
+        if start >= end:
+            return []
+        ids = self._load(session_id, record[self.TOTAL_ITEMS])['ids']
+        return [self._record(item_id) for item_id in ids[start:end]]
+
+    def advance_many(self, session_id, count, expected_index=None):
+        with self._locked():
+            found = self._find_live(session_id)
+            if found is None:
+                return None
+            slot, record = found
+            start = record[self.CURRENT_INDEX] if expected_index is None else expected_index
+            if start > record[self.CURRENT_INDEX]:
+                return [], self._state(record)
+            items = self._items(session_id, record, start, count)
+            if items and start == record[self.CURRENT_INDEX]:
+                record[self.CURRENT_INDEX] += len(items)
+                self._write_slot(slot, *record)
+            return items, self._state(record)
+
+    def items_at(self, session_id, start, count):
+        with self._locked():
+            found = self._find_live(session_id)
+            return self._items(session_id, found[1], start, count) if found is not None else None
+
+    def find_item(self, session_id, item_id):
+        try:
+            item_id = str(uuid.UUID(item_id))
+        except (ValueError, TypeError, AttributeError):
+            return None
+        with self._locked():
+            found = self._find_live(session_id)
+            if found is None:
+                return None
+            total_items = found[1][self.TOTAL_ITEMS]
+            position = self._load(session_id, total_items)['index'].get(item_id)
+            if position is None or position >= total_items:
+                return None
+            return self._record(item_id)
+
+    def append_items(self, session_id, items):
+        with self._locked():
+            found = self._find_live(session_id)
+            if found is None:
+                return False
+            slot, record = found
+            lines, size = self._write_records(items)
+            with open(self._items_path(session_id), 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+            record[self.TOTAL_ITEMS] += len(items)
+            record[self.SIZE_BYTES] += size
+            self._write_slot(slot, *record)
+            self._adjust_totals(0, size)
+            self._evict(slot)
+            return True
+
+    def finish_streaming(self, session_id):
+        with self._locked():
+            found = self._find_live(session_id)
+            if found is not None:
+                slot, record = found
+                record[self.FLAGS] &= ~self.STREAMING
+                self._write_slot(slot, *record)
+
+    def delete(self, session_id):
+        key = self._key(session_id)
+        if key is None:
+            return
+        with self._locked():
+            slot = self._find(key)
+            if slot is not None:
+                self._free(slot, session_id)
+
+    def save_answer(self, session_id, item_id, typed, started):
+        key = self._key(session_id)
+        if key is None:
+            return
+        with self._locked():
+            if self._find(key) is None:
+                return
+            answers = self._read_answers(session_id)
+            answers[item_id] = [typed, started]
+            self._write_answers(session_id, answers)
+
+    def load_answer(self, session_id, item_id):
+        if self._key(session_id) is None:
+            return None
+        answer = self._read_answers(session_id).get(item_id)
+        return tuple(answer) if answer is not None else None
+
+    def clear_answer(self, session_id, item_id):
+        if self._key(session_id) is None:
+            return
+        with self._locked():
+            answers = self._read_answers(session_id)
+            if answers.pop(item_id, None) is not None:
+                self._write_answers(session_id, answers)
+
+    def purge_expired(self):
+        now = time.time()
+        removed = 0
+        with self._locked():
+            for slot in range(self.capacity):
+                record = self._read_slot(slot)
+                if record[self.FLAGS] & self.USED and record[self.EXPIRES_AT] < now:
+                    self._free(slot, str(uuid.UUID(bytes=record[0])))
+                    removed += 1
+            if removed:
+                self._collect_records()
+            self._rehash()
+        return removed
+
+    def total_bytes(self):
+        return struct.unpack_from(self.HEADER_FORMAT, self._map, 0)[3]
+
+    def __len__(self):
+        return struct.unpack_from(self.HEADER_FORMAT, self._map, 0)[2]
+
+
+def create_session_store(backend, folder, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, capacity=DEFAULT_CAPACITY):
+    """Build the session store selected by name ('sqlite', 'mmap' or 'memory'); capacity only applies to mmap"""
+    if backend == 'memory':
+        return MemorySessionStore(ttl, max_bytes)
+
+    os.makedirs(folder, exist_ok=True)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(os.path.join(folder, 'sessions.db'), ttl, max_bytes)
+    if backend == 'mmap':
+        return MmapSessionStore(os.path.join(folder, 'sessions.mmap'), ttl, max_bytes, capacity)
+    raise ValueError(f"Unknown session store backend: {backend}")
@@ -0,0 +1,175 @@
+"""
+Static file serving for the React production build (frontend/build).
+The build is scanned once at startup into a manifest of every file with its
+content type, ETag and compressed variants, so serving an asset is a dict lookup
+with no filesystem checks. Text assets are served gzip or brotli encoded when the
+client accepts it, using .gz/.br files written next to them at build time
+(python static_assets.py) or, failing that, compressed once at startup.
+Files under static/ carry a content hash in their name and are cached by
+browsers as immutable; other files are revalidated with their ETag.
+
+    python static_assets.py ../frontend/build
+"""
+
+import os
+import sys
+import gzip
+import hashlib
+import logging
+import mimetypes
+
+from flask import Response
+
+# brotli is optional; without it only gzip variants are generated
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    brotli = None
+    HAS_BROTLI = False
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Hashed build output; a changed file gets a new name, so it never needs revalidating
+IMMUTABLE_PREFIX = 'static/'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+COMPRESSIBLE_EXTENSIONS = {'.html', '.js', '.css', '.json', '.svg', '.txt', '.ico', '.map'}
+
+# Smaller files are not worth the encoding overhead
+MIN_COMPRESS_SIZE = 1024
+
+# Source maps are only fetched by developer tools, so they are not compressed at startup
+SKIP_STARTUP_COMPRESSION = {'.map'}
+
+# Preferred first when the client accepts both
+ENCODING_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+
+INDEX_FILE = 'index.html'
+
+# Types mimetypes does not know on every platform
+MIMETYPES = {'.map': 'application/json', '.js': 'text/javascript'}
+
+
+def _compress(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _etag(data):
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+class StaticAssets:
+    """In-memory manifest of a build directory and the responses for its files"""
+
+    def __init__(self, root):
+        self.root = root
+        # URL path relative to the root -> asset dict
+        self.assets = {}
+        self.load()
+
+    def load(self):
+        """Scan the build directory; precompressed .gz/.br files become variants of their source"""
+        self.assets = {}
+        if not os.path.isdir(self.root):
+            logger.warning(f"Frontend build not found at {self.root}, static files will not be served")
+            return
+
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(tuple(suffix for _, suffix in ENCODING_SUFFIXES)):
+                    continue
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                try:
+                    self.assets[name] = self._load_asset(name, path)
+                except OSError as e:
+                    logger.error(f"Error loading static file {name}: {str(e)}")
+
+        variants = sum(len(asset['variants']) - 1 for asset in self.assets.values())
+        logger.info(f"Loaded {len(self.assets)} static files ({variants} compressed variants) from {self.root}")
+
+    def _load_asset(self, name, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        extension = os.path.splitext(name)[1].lower()
+        etag = _etag(data)
+        variants = {None: (data, etag)}
+
+        if extension in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+            for encoding, suffix in ENCODING_SUFFIXES:
+                if os.path.exists(path + suffix):
+                    with open(path + suffix, 'rb') as f:
+                        encoded = f.read()
+                elif extension not in SKIP_STARTUP_COMPRESSION and (encoding != 'br' or HAS_BROTLI):
+                    encoded = _compress(encoding, data)
+                else:
+                    continue
+                if len(encoded) < len(data):
+                    # Each encoding is a different representation, so it needs its own ETag
+                    variants[encoding] = (encoded, f"{etag}-{suffix[1:]}")
+
+        return {
+            'mimetype': MIMETYPES.get(extension) or mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            'immutable': name.startswith(IMMUTABLE_PREFIX),
+            'variants': variants
+        }
+
+    def response(self, name, request):
+        """Response for the asset, compressed and conditional as the request allows; None if unknown"""
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+
+        variants = asset['variants']
+        encoding = None
+        for candidate, _ in ENCODING_SUFFIXES:
+            if candidate in variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+        data, etag = variants[encoding]
+
+        response = Response(data, mimetype=asset['mimetype'])
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        if len(variants) > 1:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if asset['immutable'] else REVALIDATE_CACHE_CONTROL
+        response.set_etag(etag)
+        # Turns the response into a bodiless 304 when If-None-Match matches
+        return response.make_conditional(request)
+
+
+def precompress(root):
+    """Write .gz (and .br, if brotli is installed) files next to the compressible files of a build"""
+    written = 0
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            extension = os.path.splitext(filename)[1].lower()
+            if extension not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(directory, filename)
+            with open(path, 'rb') as f:
+                data = f.read()
+            if len(data) < MIN_COMPRESS_SIZE:
+                continue
+            for encoding, suffix in ENCODING_SUFFIXES:
+                if encoding == 'br' and not HAS_BROTLI:
+                    continue
+                with open(path + suffix, 'wb') as f:
+                    f.write(_compress(encoding, data))
+                written += 1
+    return written
+
+
+if __name__ == '__main__':
+    build_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                   '..', 'frontend', 'build')
+    print(f"Wrote {precompress(build_dir)} compressed files in {build_dir}")
+    if not HAS_BROTLI:
+        print("brotli is not installed, only gzip files were written")
@@ -0,0 +1,212 @@
+"""
+Study item records for TypeSpark.
+Items are identified by a hash of their content, so the same passage extracted
+from repeated uploads (or served by every quick start session) is one record
+that sessions reference by id instead of each holding their own copy.
+"""
+
+import json
+import uuid
+import hashlib
+from array import array
+from enum import IntEnum
+
+
+def item_id_for(prompt, content, item_type, context):
+    """Return the content-addressed id (UUID string) for an item"""
+    digest = hashlib.sha256(json.dumps([prompt, content, item_type, context]).encode('utf-8')).digest()
+    return str(uuid.UUID(bytes=digest[:16]))
+
+
+def make_item(prompt, content, item_type, context):
+    """Build a study item dict with a content-addressed id"""
+    return {
+        'id': item_id_for(prompt, content, item_type, context),
+        'prompt': prompt,
+        'content': content,
+        'type': item_type,
+        'context': context
+    }
+
+
+class ItemType(IntEnum):
+    """Kind of study item; serialized as the lower-case member name"""
+    TEXT = 0
+    DEFINITION = 1
+    PARAGRAPH = 2
+    KEY_CONCEPT = 3
+    LIST = 4
+    ERROR = 5
+
+    @property
+    def label(self):
+        return self.name.lower()
+
+
+class ItemContext(IntEnum):
+    """Where a study item came from; serialized as its display label"""
+    QUICK_START = 0
+    CUSTOM_TEXT = 1
+    SAMPLE = 2
+    PDF_CONTENT = 3
+    CONTENT = 4
+    TERMINOLOGY = 5
+    KEY_CONCEPTS = 6
+    LISTS = 7
+    ERROR = 8
+    EMPTY_CONTENT = 9
+
+    @property
+    def label(self):
+        return CONTEXT_LABELS[self]
+
+
+CONTEXT_LABELS = {
+    ItemContext.QUICK_START: 'Quick Start',
+    ItemContext.CUSTOM_TEXT: 'Custom Text',
+    ItemContext.SAMPLE: 'Sample',
+    ItemContext.PDF_CONTENT: 'PDF Content',
+    ItemContext.CONTENT: 'Content',
+    ItemContext.TERMINOLOGY: 'Terminology',
+    ItemContext.KEY_CONCEPTS: 'Key Concepts',
+    ItemContext.LISTS: 'Lists',
+    ItemContext.ERROR: 'Error',
+    ItemContext.EMPTY_CONTENT: 'Empty Content'
+}
+
+TYPES_BY_LABEL = {item_type.label: item_type for item_type in ItemType}
+CONTEXTS_BY_LABEL = {label: context for context, label in CONTEXT_LABELS.items()}
+
+
+class StudyItem:
+    """
+    Compact in-memory form of a study item: a 128-bit integer id and enum type and
+    context instead of a dict of strings. Labels without an enum member are kept as
+    plain strings. to_dict() returns the JSON shape served by the API.
+    """
+
+    __slots__ = ('id', 'prompt', 'content', 'type', 'context')
+
+    def __init__(self, item_id, prompt, content, item_type, context):
+        self.id = item_id
+        self.prompt = prompt
+        self.content = content
+        self.type = item_type
+        self.context = context
+
+    @classmethod
+    def from_dict(cls, item):
+        """Build a StudyItem from an item dict"""
+        return cls(
+            uuid.UUID(item['id']).int,
+            item['prompt'],
+            item['content'],
+            TYPES_BY_LABEL.get(item['type'], item['type']),
+            CONTEXTS_BY_LABEL.get(item['context'], item['context'])
+        )
+
+    @property
+    def id_str(self):
+        return str(uuid.UUID(int=self.id))
+
+    def to_dict(self):
+        """Return the item dict served by the API"""
+        return {
+            'id': self.id_str,
+            'prompt': self.prompt,
+            'content': self.content,
+            'type': self.type.label if isinstance(self.type, ItemType) else self.type,
+            'context': self.context.label if isinstance(self.context, ItemContext) else self.context
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, StudyItem):
+            return NotImplemented
+        return self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"StudyItem({self.id_str}, {self.content[:30]!r})"
+
+
+# Quick start items never change, so every quick start session shares these records
+QUICKSTART_ITEMS = (
+    make_item(
+        'Type this paragraph:',
+        'The quick brown fox jumps over the lazy dog. This is a simple sentence for testing typing speed without needing to upload a file.',
+        'text',
+        'Quick Start'
+    ),
+    make_item(
+        'Type this paragraph:',
+        'TypeSpark is a typing practice application designed to help you improve your typing skills while studying content from your documents.',
+        'text',
+        'Quick Start'
+    ),
+    make_item(
+        'Type this paragraph:',
+        'Practice makes perfect. The more you type, the faster and more accurate you will become. Try to focus on accuracy first, then speed.',
+        'text',
+        'Quick Start'
+    ),
+)
+
+
+class ItemPool:
+    """
+    Interning table of immutable item records. Each distinct item is stored once,
+    as a StudyItem, and addressed by a small integer handle; records are reference
+    counted and dropped when no session refers to them any more. Not thread-safe:
+    callers serialize access.
+    """
+
+    def __init__(self):
+        self._records = []
+        self._sizes = array('I')
+        self._refs = array('I')
+        self._handles = {}
+        self._free = []
+        self.total_bytes = 0
+
+    def intern(self, items):
+        """Add a reference to each item and return their handles as a compact array"""
+        handles = array('I')
+        for item in items:
+            record = StudyItem.from_dict(item)
+            handle = self._handles.get(record.id)
+            if handle is None:
+                size = len(json.dumps(item))
+                if self._free:
+                    handle = self._free.pop()
+                    self._records[handle] = record
+                    self._sizes[handle] = size
+                    self._refs[handle] = 0
+                else:
+                    handle = len(self._records)
+                    self._records.append(record)
+                    self._sizes.append(size)
+                    self._refs.append(0)
+                self._handles[record.id] = handle
+                self.total_bytes += size
+            self._refs[handle] += 1
+            handles.append(handle)
+        return handles
+
+    def release(self, handles):
+        """Drop one reference per handle, freeing records that are no longer used"""
+        for handle in handles:
+            self._refs[handle] -= 1
+            if self._refs[handle] == 0:
+                del self._handles[self._records[handle].id]
+                self._records[handle] = None
+                self.total_bytes -= self._sizes[handle]
+                self._free.append(handle)
+
+    def get(self, handle):
+        """Return the StudyItem for a handle"""
+        return self._records[handle]
+
+    def __len__(self):
+        return len(self._handles)
@@ -0,0 +1,31 @@
+"""
+Shared fixtures for the TypeSpark backend tests. The app keeps its uploads,
+cache and sessions relative to the working directory, so it is imported from
+a temporary directory once per test session.
+"""
+
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope='session')
+def typespark(tmp_path_factory):
+    """The app module, imported with a temporary working directory"""
+    workdir = tmp_path_factory.mktemp('typespark')
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import app
+        yield app
+    finally:
+        os.chdir(previous_dir)
+
+
+@pytest.fixture
+def client(typespark):
+    return typespark.app.test_client()
@@ -0,0 +1,163 @@
+"""API endpoints of the TypeSpark backend"""
+
+import io
+
+import pytest
+
+import pdf_parser
+from benchmark import make_pdf
+
+
+def test_metrics(client):
+    client.get('/api/quickstart')
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+    body = response.get_data(as_text=True)
+    for name in ('typespark_http_request_duration_seconds', 'typespark_sessions',
+                 'typespark_session_store_bytes', 'typespark_extraction_cache_bytes'):
+        assert f"# TYPE {name} " in body
+    samples = [line for line in body.splitlines() if line and not line.startswith('#')]
+    assert all(len(line.rsplit(' ', 1)) == 2 for line in samples)
+
+
+def start_answer(client):
+    session_id = client.get('/api/quickstart').get_json()['session_id']
+    item = client.get(f"/api/session/{session_id}/next").get_json()['item']
+    return session_id, item
+
+
+def type_keys(client, session_id, item, keys, position):
+    return client.post(f"/api/session/{session_id}/keystrokes",
+                       json={'item_id': item['id'], 'keys': keys, 'position': position})
+
+
+def test_next_with_a_cursor_is_safe_to_retry(client, typespark):
+    session_id = client.get('/api/quickstart').get_json()['session_id']
+    cursor = typespark.encode_cursor(session_id, 0)
+
+    first = client.get(f"/api/session/{session_id}/next?cursor={cursor}").get_json()
+    retried = client.get(f"/api/session/{session_id}/next?cursor={cursor}").get_json()
+    assert retried['item'] == first['item']
+    assert retried['cursor'] == first['cursor']
+
+    following = client.get(f"/api/session/{session_id}/next?cursor={first['cursor']}").get_json()
+    assert following['item']['id'] != first['item']['id']
+    assert typespark.sessions.peek(session_id)['current_index'] == 2
+
+
+def test_next_rejects_cursors_ahead_of_the_session_or_for_another_session(client, typespark):
+    session_id = client.get('/api/quickstart').get_json()['session_id']
+    client.get(f"/api/session/{session_id}/next")
+
+    response = client.get(f"/api/session/{session_id}/next?cursor={typespark.encode_cursor(session_id, 3)}")
+    assert response.status_code == 409
+    assert response.get_json()['cursor'] == typespark.encode_cursor(session_id, 1)
+    assert typespark.sessions.peek(session_id)['current_index'] == 1
+
+    other = client.get('/api/quickstart').get_json()['session_id']
+    for cursor in (typespark.encode_cursor(other, 1), 'not-a-cursor'):
+        response = client.get(f"/api/session/{session_id}/next?cursor={cursor}")
+        assert response.status_code == 400
+
+
+def test_keystrokes_resume_in_another_worker(client, typespark):
+    session_id, item = start_answer(client)
+    text = item['content']
+    assert type_keys(client, session_id, item, text[:10], 0).status_code == 200
+
+    # A worker that has not seen the answer rebuilds it from the session store
+    typespark.live_scores.clear()
+    response = type_keys(client, session_id, item, text[10:20], 10)
+    assert response.status_code == 200
+    assert response.get_json()['position'] == 20
+    assert response.get_json()['errors'] == 0
+
+
+def test_keystrokes_replay_answer_changed_by_another_worker(client, typespark):
+    session_id, item = start_answer(client)
+    text = item['content']
+    assert type_keys(client, session_id, item, text[:10], 0).status_code == 200
+
+    # Another worker applied a delta with a typo; this worker's state is out of date
+    started = typespark.sessions.load_answer(session_id, item['id'])[1]
+    typespark.sessions.save_answer(session_id, item['id'], text[:10] + '#', started)
+    response = type_keys(client, session_id, item, '\b' + text[10:15], 11)
+    assert response.status_code == 200
+    assert response.get_json()['position'] == 15
+    assert response.get_json()['errors'] == 0
+
+    assert type_keys(client, session_id, item, 'x', 10).get_json()['position'] == 15
+
+
+def test_keystrokes_report_no_wpm_before_minimum_interval(client, typespark, monkeypatch):
+    session_id, item = start_answer(client)
+    text = item['content']
+    first = type_keys(client, session_id, item, text[:5], 0).get_json()
+    assert first['wpm'] is None
+
+    started = typespark.live_scores[(session_id, item['id'])]['started']
+    monkeypatch.setattr(typespark.time, 'time', lambda: started + 6)
+    later = type_keys(client, session_id, item, text[5:10], 5).get_json()
+    assert later['wpm'] == pytest.approx(20)
+
+    timed = client.post(f"/api/session/{session_id}/keystrokes",
+                        json={'item_id': item['id'], 'keys': '', 'position': 10, 'time_taken': 3}).get_json()
+    assert timed['wpm'] == pytest.approx(40)
+
+
+@pytest.fixture
+def build(typespark, tmp_path, monkeypatch):
+    """A frontend build with a script and its source map"""
+    (tmp_path / 'static' / 'js').mkdir(parents=True)
+    (tmp_path / 'static' / 'js' / 'main.js').write_text('console.log("typespark");\n' * 200)
+    (tmp_path / 'static' / 'js' / 'main.js.map').write_text('{"mappings": "%s"}' % ('AAAA;' * 1000))
+    monkeypatch.setattr(typespark, 'static_assets', typespark.StaticAssets(str(tmp_path)))
+
+
+@pytest.mark.parametrize('path,encoding', [('static/js/main.js', 'gzip'), ('static/js/main.js.map', None)])
+def test_static_assets_revalidate(client, build, path, encoding):
+    headers = {'Accept-Encoding': 'gzip'}
+    response = client.get(f"/{path}", headers=headers)
+    assert response.status_code == 200
+    assert response.headers.get('Content-Encoding') == encoding
+
+    response = client.get(f"/{path}", headers=dict(headers, **{'If-None-Match': response.headers['ETag']}))
+    assert response.status_code == 304
+
+
+def test_submit_rejects_answers_far_longer_than_the_item(client):
+    session_id, item = start_answer(client)
+    response = client.post(f"/api/session/{session_id}/submit",
+                           json={'item_id': item['id'], 'answer': item['content'] * 3 + 'x' * 200})
+    assert response.status_code == 413
+
+    response = client.post(f"/api/session/{session_id}/submit",
+                           json={'item_id': item['id'], 'answer': item['content'][:-3] + 'xyz', 'time_taken': 5})
+    assert response.status_code == 200
+    assert response.get_json()['result']['errors']['substitutions'] == 3
+
+
+def upload(client, data, filename, query=''):
+    return client.post(f"/api/upload{query}", data={'file': (io.BytesIO(data), filename)},
+                       content_type='multipart/form-data')
+
+
+@pytest.mark.skipif(not (pdf_parser.HAS_PYMUPDF or pdf_parser.HAS_PYPDF2), reason="needs a PDF library")
+def test_streamed_extraction_is_not_served_to_sync_uploads(client, typespark, monkeypatch):
+    data = make_pdf(10, 'definitions', seed='stream-order')
+    expected = [item['content'] for item in pdf_parser.PDFParser(data).extract_items()]
+
+    # Streamed items arrive in page order, which need not match extract_items()
+    iter_items = pdf_parser.PDFParser.iter_items
+    monkeypatch.setattr(pdf_parser.PDFParser, 'iter_items', lambda self: reversed(list(iter_items(self))))
+
+    response = upload(client, data, 'stream.pdf', '?stream=1')
+    assert response.get_json()['streaming']
+    for thread in list(typespark.streaming_producers):
+        thread.join()
+
+    session_id = upload(client, data, 'sync.pdf').get_json()['session_id']
+    items = client.get(f"/api/session/{session_id}").get_json()['items']
+    assert [item['content'] for item in items] == expected
@@ -0,0 +1,82 @@
+"""Asynchronous and batch PDF ingestion through the process pools"""
+
+import io
+import time
+
+import pytest
+
+import pdf_parser
+from benchmark import make_pdf
+from jobs import JobQueue
+
+pytestmark = pytest.mark.skipif(not pdf_parser.HAS_PYMUPDF, reason="parallel page extraction needs PyMuPDF")
+
+JOB_TIMEOUT = 20
+
+
+@pytest.fixture
+def parallel_pages(monkeypatch):
+    """Extract pages in a pool of several workers, whatever the CPU count of this machine"""
+    monkeypatch.setattr(pdf_parser, 'PAGE_WORKERS', 4)
+
+
+def upload(client, data, filename, query=''):
+    return client.post(f"/api/upload{query}", data={'file': (io.BytesIO(data), filename)},
+                       content_type='multipart/form-data')
+
+
+def wait_for_job(client, job_id):
+    deadline = time.time() + JOB_TIMEOUT
+    while time.time() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").get_json()
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.1)
+    pytest.fail(f"Job {job_id} did not finish within {JOB_TIMEOUT} seconds")
+
+
+def assert_extracted(client, session_id):
+    items = client.get(f"/api/session/{session_id}").get_json()['items']
+    assert items
+    assert not any('OCR' in item['content'] for item in items)
+
+
+def test_async_upload_after_sync_upload(client, parallel_pages):
+    # The sync upload starts the page pool in this process before the job pool forks
+    response = upload(client, make_pdf(30, 'prose', seed='sync'), 'sync.pdf')
+    assert response.status_code == 200
+    assert_extracted(client, response.get_json()['session_id'])
+
+    response = upload(client, make_pdf(30, 'definitions', seed='async'), 'async.pdf', '?async=1')
+    assert response.status_code == 202
+    job = wait_for_job(client, response.get_json()['job_id'])
+    assert job['status'] == 'completed', job['error']
+    assert_extracted(client, job['session_id'])
+
+
+def test_batch_upload_after_sync_upload(client, parallel_pages):
+    response = upload(client, make_pdf(30, 'lists', seed='sync-batch'), 'sync.pdf')
+    assert response.status_code == 200
+
+    started = time.time()
+    response = client.post('/api/upload/batch', data={'files': [
+        (io.BytesIO(make_pdf(30, 'prose', seed='batch-1')), 'one.pdf'),
+        (io.BytesIO(make_pdf(30, 'dense', seed='batch-2')), 'two.pdf')
+    ]}, content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert time.time() - started < JOB_TIMEOUT
+    result = response.get_json()
+    assert all('error' not in entry for entry in result['files'])
+    assert_extracted(client, result['session_id'])
+
+
+def test_job_status_is_shared_between_workers(client, typespark):
+    response = upload(client, make_pdf(5, 'definitions', seed='shared'), 'shared.pdf', '?async=1')
+    job_id = response.get_json()['job_id']
+    job = wait_for_job(client, job_id)
+    assert job['status'] == 'completed', job['error']
+
+    # Another server worker has its own queue on the same database
+    other = JobQueue(typespark.job_queue.path)
+    assert other.get(job_id) == job
+    assert job['progress']['pages_done'] == job['progress']['pages_total'] > 0
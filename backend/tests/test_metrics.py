@@ -0,0 +1,103 @@
+"""Per-thread metric shards and the cross-process scrape"""
+
+import os
+import json
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import metrics
+
+COUNTER = 'typespark_pdf_pages_total'
+HISTOGRAM = 'typespark_extraction_seconds'
+
+
+@pytest.fixture
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    return tmp_path
+
+
+def counter(data, name, **labels):
+    labels = [list(pair) for pair in sorted(labels.items())]
+    return sum(value for metric, metric_labels, value in data['counters']
+               if metric == name and metric_labels == labels)
+
+
+def histogram(data, name, **labels):
+    labels = [list(pair) for pair in sorted(labels.items())]
+    for metric, metric_labels, values in data['histograms']:
+        if metric == name and metric_labels == labels:
+            return values
+    return None
+
+
+def record_in_threads(count, test):
+    def record():
+        for _ in range(100):
+            metrics.inc(COUNTER, test=test)
+        metrics.observe(HISTOGRAM, 0.02, test=test)
+
+    threads = [threading.Thread(target=record) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_shards_of_exited_threads_are_folded_into_the_totals():
+    record_in_threads(8, 'retire')
+    data = metrics.snapshot()
+    assert counter(data, COUNTER, test='retire') == 800
+    values = histogram(data, HISTOGRAM, test='retire')
+    assert values[-1] == 8
+    assert values[metrics.LATENCY_BUCKETS.index(0.025)] == 8
+    assert values[-2] == pytest.approx(0.16)
+
+    # Threads that come and go do not leave a shard each behind
+    record_in_threads(32, 'retire')
+    data = metrics.snapshot()
+    assert counter(data, COUNTER, test='retire') == 4000
+    assert histogram(data, HISTOGRAM, test='retire')[-1] == 40
+    assert not any(not thread.is_alive() for thread, _ in metrics._shards)
+
+
+def test_running_threads_are_read_from_their_own_shards():
+    recorded, release = threading.Event(), threading.Event()
+
+    def record():
+        metrics.inc(COUNTER, 5, test='running')
+        recorded.set()
+        release.wait()
+
+    thread = threading.Thread(target=record)
+    thread.start()
+    try:
+        recorded.wait()
+        assert counter(metrics.snapshot(), COUNTER, test='running') == 5
+        assert any(running is thread for running, _ in metrics._shards)
+    finally:
+        release.set()
+        thread.join()
+    assert counter(metrics.snapshot(), COUNTER, test='running') == 5
+
+
+def test_collect_adds_other_processes_and_archives_exited_ones(metrics_dir):
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    snapshot = {'counters': [[COUNTER, [['test', 'collect']], 7]], 'histograms': []}
+    (metrics_dir / f"{os.getppid()}.json").write_text(json.dumps(snapshot))
+    (metrics_dir / f"{exited.pid}.json").write_text(json.dumps(snapshot))
+    metrics.inc(COUNTER, 1, test='collect')
+
+    counters, _ = metrics.collect()
+    assert counters[(COUNTER, (('test', 'collect'),))] == 15
+    assert not (metrics_dir / f"{exited.pid}.json").exists()
+    assert (metrics_dir / metrics.ARCHIVE_FILE).exists()
+
+    # The archived snapshot still counts on the next scrape
+    counters, _ = metrics.collect()
+    assert counters[(COUNTER, (('test', 'collect'),))] == 15
+    assert f'{COUNTER}{{test="collect"}} 15' in metrics.render()
@@ -0,0 +1,46 @@
+"""Study item extraction from PDF text"""
+
+import pytest
+
+import pdf_parser
+from benchmark import make_pdf
+from pdf_parser import PDFParser, PARAGRAPH_MAX_LENGTH, ITEM_LIMITS
+
+pytestmark = pytest.mark.skipif(not (pdf_parser.HAS_PYMUPDF or pdf_parser.HAS_PYPDF2),
+                                reason="needs a PDF library")
+
+
+@pytest.mark.parametrize('pages,layout', [(10, 'prose'), (60, 'prose'), (30, 'dense')])
+def test_long_text_is_split_into_paragraphs(pages, layout):
+    data = make_pdf(pages, layout)
+    for items in (PDFParser(data).extract_items(), list(PDFParser(data).iter_items())):
+        paragraphs = [item for item in items if item['type'] == 'paragraph']
+        assert len(paragraphs) == ITEM_LIMITS['paragraph']
+        assert all(len(item['content']) <= PARAGRAPH_MAX_LENGTH for item in paragraphs)
+
+
+def test_short_paragraphs_are_kept_whole():
+    text = "This paragraph has more than ten words and comfortably over fifty characters in it.\n\n"
+    items = PDFParser(b'')._scan_items(text * 3, dict(ITEM_LIMITS))
+    assert [item['content'] for item in items] == [text.strip()] * 3
+
+
+@pytest.mark.skipif(not pdf_parser.HAS_PYMUPDF, reason="needs PyMuPDF for parallel extraction")
+def test_parallel_extraction_stops_submitting_shards_at_the_content_budget(monkeypatch):
+    submitted = []
+    pool = pdf_parser._get_page_pool(2)
+
+    class CountingPool:
+        def submit(self, fn, source, first, last, *args):
+            submitted.append((first, last))
+            return pool.submit(fn, source, first, last, *args)
+
+    monkeypatch.setattr(pdf_parser, '_get_page_pool', lambda workers: CountingPool())
+    parser = PDFParser(make_pdf(200, 'prose'), workers=2)
+    text = parser.extract_text().raw_text
+
+    assert 'maximum content size reached' in text
+    # The budget fills within the first few shards; only one more per worker may have started
+    pages_read = len(text) // 2000 + 1
+    assert len(submitted) <= -(-pages_read // pdf_parser.PAGES_PER_SHARD) + 2
+    assert len(submitted) < 200 // pdf_parser.PAGES_PER_SHARD
@@ -0,0 +1,80 @@
+"""Answer scoring against a plain dynamic-programming edit distance"""
+
+import random
+
+import pytest
+
+from scoring import (score_answer, bit_parallel_distance, banded_alignment, edit_lower_bound,
+                     IncrementalScorer, BACKSPACE, MAX_BANDED_EDITS)
+
+ALPHABET = 'abcde fghij.'
+
+
+def distances(expected, answer):
+    """Last row of the Levenshtein table: edit distance of answer to each prefix of expected"""
+    row = list(range(len(expected) + 1))
+    for i, char in enumerate(answer, 1):
+        previous, row = row, [i]
+        for j, expected_char in enumerate(expected, 1):
+            row.append(min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + (char != expected_char)))
+    return row
+
+
+def mutate(rng, text, edits):
+    chars = list(text)
+    for _ in range(edits):
+        position = rng.randrange(len(chars) + 1)
+        operation = rng.randrange(3)
+        if operation == 0 or position == len(chars):
+            chars.insert(position, rng.choice(ALPHABET))
+        elif operation == 1:
+            del chars[position]
+        else:
+            chars[position] = rng.choice(ALPHABET)
+    return ''.join(chars)
+
+
+def cases(count, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        expected = ''.join(rng.choice(ALPHABET) for _ in range(rng.randrange(1, 120)))
+        yield expected, mutate(rng, expected, rng.choice([0, 1, 3, 10, 40, 150]))
+
+
+@pytest.mark.parametrize('expected,answer', list(cases(100, 'score')))
+def test_score_answer_matches_reference(expected, answer):
+    distance = distances(expected, answer)[-1]
+    score = score_answer(expected, answer)
+    assert score['distance'] == distance
+    assert score['insertions'] - score['deletions'] == len(answer) - len(expected)
+    assert score['matches'] == len(expected) - score['deletions'] - score['substitutions']
+    assert bit_parallel_distance(expected, answer) == distance
+    assert edit_lower_bound(expected, answer) <= distance
+
+
+def test_banded_alignment_gives_up_past_max_edits():
+    expected = 'a' * 300
+    assert banded_alignment(expected, 'b' * 300) is None
+    assert banded_alignment(expected, 'b' * 300, max_edits=300) == (0, 0, 300)
+    score = score_answer(expected, 'b' * 300)
+    assert score['distance'] == 300 > MAX_BANDED_EDITS
+    assert score['matches'] == 0
+
+
+def test_incremental_scorer_matches_reference():
+    rng = random.Random('incremental')
+    for expected, target in cases(40, 'incremental'):
+        scorer = IncrementalScorer(expected)
+        typed = ''
+        for char in target:
+            if typed and rng.random() < 0.15:
+                # Type a wrong character, then take it back
+                scorer.feed(rng.choice(ALPHABET) + BACKSPACE)
+            scorer.feed(char)
+            typed += char
+            assert scorer.typed == typed
+            assert scorer.errors() == min(distances(expected, typed))
+        for _ in range(rng.randrange(len(typed) + 1)):
+            scorer.feed(BACKSPACE)
+            typed = typed[:-1]
+        assert scorer.errors() == min(distances(expected, typed))
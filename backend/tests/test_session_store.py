@@ -0,0 +1,163 @@
+"""Session store backends"""
+
+import uuid
+import threading
+
+import pytest
+
+import session_store
+from session_store import MmapSessionStore, create_session_store
+from study_items import make_item
+
+BACKENDS = ['memory', 'sqlite', 'mmap']
+
+
+def make_items(count, tag='item'):
+    return [make_item("Type this paragraph:", f"{tag} {i} of a session", 'paragraph', 'Content')
+            for i in range(count)]
+
+
+def new_id():
+    return str(uuid.uuid4())
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A session_store clock that only moves when the test advances it"""
+    class Clock:
+        now = 1_000_000.0
+
+        def time(self):
+            return self.now
+
+    clock = Clock()
+    monkeypatch.setattr(session_store, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, tmp_path):
+    if request.param == 'mmap' and session_store.fcntl is None:
+        pytest.skip("the mmap backend needs fcntl")
+    return create_session_store(request.param, str(tmp_path), ttl=60, capacity=256)
+
+
+def test_advance_with_expected_index_is_compare_and_swap(store):
+    session_id = new_id()
+    items = make_items(5)
+    store.create(session_id, items, 'cas.txt')
+
+    first, state = store.advance_many(session_id, 2, expected_index=0)
+    assert [item['id'] for item in first] == [item['id'] for item in items[:2]]
+    assert state['current_index'] == 2
+
+    # A retried request gets the same items and the cursor stays put
+    retried, state = store.advance_many(session_id, 2, expected_index=0)
+    assert [item['id'] for item in retried] == [item['id'] for item in first]
+    assert state['current_index'] == 2
+
+    # A cursor the session has not reached yet gets nothing
+    ahead, state = store.advance_many(session_id, 2, expected_index=4)
+    assert ahead == []
+    assert state['current_index'] == 2
+
+    assert store.advance_many(new_id(), 1, expected_index=0) is None
+
+
+def test_concurrent_advances_hand_out_each_item_once(store):
+    session_id = new_id()
+    items = make_items(200)
+    store.create(session_id, items, 'concurrent.txt')
+    taken = []
+
+    def take():
+        while True:
+            item, _ = store.advance(session_id)
+            if item is None:
+                return
+            taken.append(item['id'])
+
+    threads = [threading.Thread(target=take) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(taken) == sorted(item['id'] for item in items)
+    assert store.peek(session_id)['current_index'] == len(items)
+
+
+def test_idle_sessions_expire_after_ttl(store, clock):
+    idle, active = new_id(), new_id()
+    store.create(idle, make_items(2, 'idle'), 'idle.txt')
+    store.create(active, make_items(2, 'active'), 'active.txt')
+
+    clock.now += 40
+    assert store.get(active) is not None
+    clock.now += 40
+    assert store.get(idle) is None
+    assert store.get(active) is not None
+
+    clock.now += 61
+    assert store.purge_expired() >= 1
+    assert len(store) == 0
+    assert store.peek(active) is None
+
+
+def test_least_recently_used_sessions_are_evicted_over_budget(store, clock):
+    kept = new_id()
+    store.create(kept, make_items(4, 'kept'), 'kept.txt')
+    store.max_bytes = store.total_bytes() * 3
+    session_ids = []
+    for i in range(10):
+        clock.now += 1
+        # Keep one session in use while the others go idle
+        assert store.get(kept) is not None
+        clock.now += 1
+        session_ids.append(new_id())
+        store.create(session_ids[-1], make_items(4, f"session-{i}"), 'file.txt')
+
+    assert store.total_bytes() <= store.max_bytes
+    assert store.evictions['lru'] > 0
+    assert store.peek(kept) is not None
+    assert store.peek(session_ids[0]) is None
+    assert store.peek(session_ids[-1]) is not None
+
+
+def test_answers_are_stored_per_item_and_removed_with_the_session(store):
+    session_id = new_id()
+    items = make_items(2)
+    store.create(session_id, items, 'answers.txt')
+    first, second = items[0]['id'], items[1]['id']
+
+    assert store.load_answer(session_id, first) is None
+    store.save_answer(session_id, first, 'item 0', 12.5)
+    store.save_answer(session_id, second, 'it', 13.0)
+    store.save_answer(session_id, first, 'item 0 of', 12.5)
+    assert tuple(store.load_answer(session_id, first)) == ('item 0 of', 12.5)
+    assert 'answers' not in store.get(session_id)
+
+    store.clear_answer(session_id, first)
+    assert store.load_answer(session_id, first) is None
+    assert tuple(store.load_answer(session_id, second)) == ('it', 13.0)
+
+    store.delete(session_id)
+    store.create(session_id, items, 'answers.txt')
+    assert store.load_answer(session_id, second) is None
+
+
+def test_mmap_evicts_least_recently_used_when_table_fills(tmp_path):
+    store = MmapSessionStore(str(tmp_path / 'sessions.mmap'), capacity=64)
+    kept = new_id()
+    store.create(kept, make_items(1, 'kept'), 'kept.txt')
+    session_ids = []
+    for i in range(200):
+        session_ids.append(new_id())
+        store.create(session_ids[-1], make_items(1, i), 'file.txt')
+        # Keep one session in use while the others go idle
+        assert store.peek(kept) is not None
+
+    assert len(store) <= store.max_sessions
+    assert store.evictions['lru'] > 0
+    assert store.peek(session_ids[0]) is None
+    assert store.peek(session_ids[-1]) is not None
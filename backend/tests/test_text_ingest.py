@@ -0,0 +1,36 @@
+"""Streaming decoding and paragraph splitting of text uploads"""
+
+import io
+
+import pytest
+
+from text_ingest import iter_decoded, iter_text_items
+
+
+def decode(data, block_size):
+    return "".join(iter_decoded(io.BytesIO(data), block_size))
+
+
+@pytest.mark.parametrize('block_size', [1, 2, 3, 7, 64 * 1024])
+def test_mixed_utf8_and_invalid_bytes(block_size):
+    # Valid UTF-8 (two, three and four byte sequences) around latin-1 bytes that are not UTF-8
+    data = "naïve – 日本語 🙂 ".encode('utf-8') + b"caf\xe9 \xff\xfe " + "über".encode('utf-8')
+    assert decode(data, block_size) == "naïve – 日本語 🙂 café ÿþ über"
+
+
+@pytest.mark.parametrize('block_size', [1, 5, 64 * 1024])
+def test_valid_utf8_split_across_blocks(block_size):
+    text = "Ünïcödé paragraphs 🙂 " * 20
+    assert decode(text.encode('utf-8'), block_size) == text
+
+
+def test_truncated_sequence_at_end_of_file():
+    assert decode("ok é".encode('utf-8')[:-1], 2) == "ok \xc3"
+
+
+def test_items_keep_utf8_after_invalid_byte():
+    paragraphs = ["Première paragraphe avec des caractères accentués à taper.",
+                  "Second paragraph with a stray byte \x00 and the word ünïcode in it."]
+    data = paragraphs[0].encode('utf-8') + b" \x92\n\n" + paragraphs[1].encode('utf-8')
+    items = list(iter_text_items(io.BytesIO(data), block_size=16))
+    assert [item['content'] for item in items] == [paragraphs[0] + " \x92", paragraphs[1]]
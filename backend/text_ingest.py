@@ -0,0 +1,128 @@
+"""
+Streaming plain-text ingestion for TypeSpark.
+Text files are read in fixed-size blocks through an incremental decoder and
+split into paragraphs as they arrive, so items can be written to the session
+store while the file is still being read and memory use does not grow with
+the size of the file.
+"""
+
+import codecs
+import logging
+
+from study_items import make_item
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bytes read from the file at a time
+BLOCK_SIZE = 64 * 1024
+
+# A paragraph longer than this is split at a line break (or space) to bound memory
+MAX_PARAGRAPH_LENGTH = 64 * 1024
+
+# Text shorter than this becomes a single item, as does a file without usable paragraphs
+MIN_TEXT_LENGTH = 100
+FALLBACK_LENGTH = 2000
+
+# Paragraphs must be longer than this to become an item
+MIN_PARAGRAPH_LENGTH = 10
+
+
+def _latin1_fallback(error):
+    """Decode error handler: read each byte that is not valid UTF-8 as a latin-1 character"""
+    return error.object[error.start:error.end].decode('latin-1'), error.end
+
+
+codecs.register_error('typespark-latin1-fallback', _latin1_fallback)
+
+
+def iter_decoded(f, block_size=BLOCK_SIZE):
+    """
+    Yield decoded text from a binary file in blocks. Input is decoded as UTF-8,
+    and only the bytes that are not valid UTF-8 fall back to latin-1, one
+    character per byte, so valid multibyte text around them is kept intact.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='typespark-latin1-fallback')
+    while True:
+        block = f.read(block_size)
+        final = not block
+        text = decoder.decode(block, final=final)
+        if text:
+            yield text
+        if final:
+            return
+
+
+def iter_paragraphs(chunks):
+    """Yield stripped, non-empty paragraphs (separated by blank lines) from a stream of text"""
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        parts = pending.split('\n\n')
+        pending = parts.pop()
+        for part in parts:
+            paragraph = part.strip()
+            if paragraph:
+                yield paragraph
+
+        # Flush an overlong paragraph at its last line break or space
+        while len(pending) > MAX_PARAGRAPH_LENGTH:
+            cut = pending.rfind('\n', 0, MAX_PARAGRAPH_LENGTH)
+            if cut <= 0:
+                cut = pending.rfind(' ', 0, MAX_PARAGRAPH_LENGTH)
+            if cut <= 0:
+                cut = MAX_PARAGRAPH_LENGTH
+            paragraph = pending[:cut].strip()
+            pending = pending[cut:]
+            if paragraph:
+                yield paragraph
+
+    paragraph = pending.strip()
+    if paragraph:
+        yield paragraph
+
+
+def iter_text_items(f, block_size=BLOCK_SIZE):
+    """
+    Yield study items for a text file opened in binary mode (or an upload
+    stream), one per paragraph. Only the first FALLBACK_LENGTH characters are
+    kept in memory, for the single-item fallbacks.
+    """
+    head = []
+    head_length = 0
+    held = []
+    found = 0
+
+    def decoded():
+        nonlocal head_length
+        for text in iter_decoded(f, block_size):
+            if head_length < FALLBACK_LENGTH:
+                head.append(text[:FALLBACK_LENGTH - head_length])
+                head_length += len(head[-1])
+            yield text
+
+    for paragraph in iter_paragraphs(decoded()):
+        if len(paragraph) <= MIN_PARAGRAPH_LENGTH:
+            continue
+        found += 1
+        item = make_item('Type this paragraph:', paragraph, 'text', 'Custom Text')
+        # Hold items back until the text is known not to be short
+        if head_length < MIN_TEXT_LENGTH:
+            held.append(item)
+            continue
+        for held_item in held:
+            yield held_item
+        held = []
+        yield item
+
+    text = "".join(head)
+    if len(text) < MIN_TEXT_LENGTH:
+        # Very short text is typed as a whole
+        yield make_item('Type this text:', text, 'text', 'Custom Text')
+        return
+
+    for held_item in held:
+        yield held_item
+    if not found:
+        yield make_item('Type this text:', text[:FALLBACK_LENGTH], 'text', 'Custom Text')
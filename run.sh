@@ -10,6 +10,16 @@ cleanup() {
 # Set up trap to handle Ctrl+C
 trap cleanup INT TERM
 
+# ./run.sh --production serves the backend (and the frontend build) with gunicorn
+if [ "$1" == "--production" ]; then
+    echo "Starting the backend with gunicorn..."
+    cd backend
+    source venv/bin/activate
+    # Compress the frontend build once instead of in every server start
+    python static_assets.py ../frontend/build
+    exec gunicorn -c gunicorn.conf.py app:app
+fi
+
 # Start the backend - Explicitly setting port to 5002
 echo "Starting the backend..."
 cd backend